@@ -1,20 +1,61 @@
 #!/usr/bin/env python
+import os
+import shutil
+import tempfile
+
 import numpy as np
 
 
-def frequencyofints(a ,memeff = True) :
+# Largest ratio of the range of the values to their number for which
+# frequencyofints counts with np.bincount
+_DENSITY = 4
+
+
+def _runlengths(s):
+	"""
+	return (vals, freq) for the sorted array s: its distinct values and
+	the lengths of their runs
+	"""
+	if len(s) == 0:
+		return s[:0], np.zeros(0, dtype=np.intp)
+	starts = np.flatnonzero(np.concatenate(([True], s[1:] != s[:-1])))
+	freq = np.diff(np.concatenate((starts, [len(s)])))
+	return s[starts], freq
+
+
+def _countmethod(a):
+	"""
+	return the method of counting the integer array a that needs the
+	least work: 'bincount' if the range of its values is not much
+	larger than its size, 'sort' otherwise or if a is not an array of
+	integers (eg. float ids)
+	"""
+	if len(a) == 0 or a.dtype.kind not in 'iub':
+		return 'sort'
+	span = int(a.max()) - int(a.min()) + 1
+	if span <= _DENSITY * len(a) + 1024:
+		return 'bincount'
+	return 'sort'
+
+
+def frequencyofints(a ,memeff = True, method = None) :
 	
 	"""
 	find the frequency of integers in an integer array a
 
 	args:
 		a : integer array, mandatory
+			it is not modified
 		memeff: bool, optional, defaults to True
-			uses a naive but memory efficient 
-			method where the bottleneck step is a 
-			sort algorithm (np.sort), so in principle 
-			is O N ln(N), and is memory efficient for 
-			arrays of large integers
+			if True, the method is chosen from the range and
+			the size of a so as to never take more memory than
+			a few copies of a: np.bincount if the range of the
+			values is at most a few times the size of a,
+			otherwise a sort (np.sort, so O N ln(N)) followed
+			by a vectorized run length count. If False, 
+			np.bincount is used whatever the range.
+		method: string, optional, defaults to None
+			'bincount' or 'sort' to force the method
 	returns:
 		tuple (vals, freq ) where vals are unique integers
 		in the array a, and freq is a tuple of frequencies with 
@@ -22,104 +63,620 @@ def frequencyofints(a ,memeff = True) :
 	status: 
 		tested , R. Biswas, Sun May 11 23:14:39 CDT 2014
 		tests in test_sorting.py			
+		Vectorized, without sorting a in place. np.bincount is
+		offset by the minimum, so negative integers are counted.
 	example_usage:
 		>>> z = np.array([1,3,4,2,5,2,3])
 		>>> val, freq =  su.frequencyofints(z) 
+
+	For data too large for the memory, see FrequencyCounter.
 	"""
-	if memeff :
-		a.sort()
-		#get unique list of values:
-		u = np.unique(a) 
-
-		freq = np.zeros(len(u), dtype =  int) 
-		j = 0 
-		for i,ue in enumerate(u) :
-			while u[i] == a[j] :
-				freq[i] += 1
-				if j == len(a) - 1:
-					break
-				j += 1 
-		return u , freq			
-		
-	else:
-		x  = np.bincount(a) 
+	a = np.asarray(a).ravel()
+	if method is None:
+		method = _countmethod(a) if memeff else 'bincount'
+	if method == 'bincount':
+		if a.dtype.kind not in 'iub':
+			raise TypeError("bincount only counts integers, not %s"
+				% a.dtype)
+		if len(a) == 0:
+			return a.copy(), np.zeros(0, dtype=np.intp)
+		if a.dtype == bool:
+			offset = None
+			shifted = a.view(np.uint8)
+		else:
+			offset = a.min()
+			shifted = a - offset
+			if a.dtype.kind == 'i':
+				# the differences to the minimum, which may overflow
+				# the signed type, are exact as unsigned integers
+				shifted = shifted.view('u%d' % a.dtype.itemsize)
+		x  = np.bincount(shifted.astype(np.intp))
 		vals  = np.nonzero(x) [0]
 		freq = x[vals]
+		vals = vals.astype(a.dtype)
+		if offset is not None:
+			vals += offset
+	elif method == 'sort':
+		vals, freq = _runlengths(np.sort(a))
+	else:
+		raise ValueError("unknown method %s" % method)
 
 	return vals, freq 
+
+
+def _topk(vals, freq, k):
+	"""
+	return the (vals, freq) of the k largest frequencies of the table
+	(vals, freq), in decreasing order of frequency and increasing order
+	of value for equal frequencies, selected with np.argpartition 
+	"""
+	if k < len(freq):
+		top = np.argpartition(-freq, k - 1)[:k]
+		vals, freq = vals[top], freq[top]
+	order = np.lexsort((vals, -freq))
+	return vals[order], freq[order]
+
+
+def mostfrequentints(a, k, memeff=True, method=None):
+	"""
+	find the k most frequent integers in an integer array a, from the
+	exact counts of frequencyofints, without sorting them all
+
+	args:
+		a : integer array, mandatory
+		k : int, mandatory
+			number of integers returned, at most
+		memeff, method: optional, as for frequencyofints
+	returns:
+		tuple (vals, freq) of the k most frequent integers and 
+		their frequencies, in decreasing order of frequency (and
+		increasing order of the integers with equal frequencies)
+	example_usage:
+		>>> vals, freq = su.mostfrequentints([5, 1, 5, 2, 1, 5, 9], 2)
+		>>> vals.tolist(), freq.tolist()
+		([5, 1], [3, 2])
+	"""
+	if k <= 0:
+		raise ValueError("k must be positive")
+	vals, freq = frequencyofints(a, memeff=memeff, method=method)
+	return _topk(vals, freq, k)
+
+
+def _mergecounts(vals, freqs):
+	"""
+	merge lists of (vals, freq) tables of counts into a single table
+	sorted by value
+	"""
+	vals = np.concatenate(vals)
+	freqs = np.concatenate(freqs)
+	order = np.argsort(vals, kind='mergesort')
+	vals, freqs = vals[order], freqs[order]
+	if len(vals) == 0:
+		return vals, freqs
+	starts = np.flatnonzero(np.concatenate(([True], vals[1:] != vals[:-1])))
+	return vals[starts], np.add.reduceat(freqs, starts)
+
+
+class FrequencyCounter(object):
+	"""
+	counter of the frequencies of integers fed chunk by chunk, so that
+	arrays which do not fit in the memory can be counted. Each chunk is
+	counted with frequencyofints, and the counts of the chunks are merged
+	into a table sorted by value only when they grow as large as the table,
+	so that the merges cost O(N log N) overall. Only the distinct values
+	and their counts are kept. Counters fed with different parts of the
+	data (eg. in several processes) can be combined with merge.
+
+	args:
+		chunks: iterable of integer arrays, optional, defaults to ()
+			chunks counted at once
+	example_usage:
+		>>> counter = su.FrequencyCounter()
+		>>> for chunk in np.array_split(np.array([1, 3, 3, 7, 1, 3]), 3):
+		...	counter.update(chunk)
+		>>> vals, freq = counter.result()
+		>>> vals.tolist(), freq.tolist()
+		([1, 3, 7], [2, 3, 1])
+	"""
+	def __init__(self, chunks=()):
+		# the tables take the type of the first chunk
+		self.vals = None
+		self.freq = None
+		self._pending = []
+		self._numpending = 0
+		for chunk in chunks:
+			self.update(chunk)
+
+	def update(self, chunk):
+		"""
+		count the integers of the array chunk
+		"""
+		vals, freq = frequencyofints(chunk)
+		self._add(vals, freq)
+
+	def _add(self, vals, freq):
+		if self.vals is None:
+			self.vals, self.freq = vals[:0], freq[:0]
+		self._pending.append((vals, freq))
+		self._numpending += len(vals)
+		if self._numpending >= len(self.vals):
+			self._merge()
+
+	def _merge(self):
+		if len(self._pending) == 0:
+			return
+		vals, freqs = zip(*self._pending)
+		self.vals, self.freq = _mergecounts((self.vals,) + vals,
+			(self.freq,) + freqs)
+		self._pending = []
+		self._numpending = 0
+
+	def merge(self, other):
+		"""
+		add the counts of the FrequencyCounter other to this one
+		"""
+		other._merge()
+		if other.vals is not None:
+			self._add(other.vals, other.freq)
+
+	def result(self):
+		"""
+		return the tuple (vals, freq) of the distinct integers counted,
+		in increasing order, and their frequencies
+		"""
+		self._merge()
+		if self.vals is None:
+			return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.intp)
+		return self.vals, self.freq
+
+	def top(self, k):
+		"""
+		return the tuple (vals, freq) of the k most frequent integers
+		counted, as mostfrequentints
+		"""
+		return _topk(*self.result(), k=k)
+
+
+class HeavyHitters(object):
+	"""
+	bounded memory summary of the most frequent integers fed chunk by 
+	chunk, by the Misra-Gries algorithm: at most k integers are kept
+	with counts which underestimate their frequencies by at most 
+	errorbound <= n / (k + 1), n being the number of integers counted. 
+	Every integer more frequent than n / (k + 1) is thus kept. Each
+	chunk is counted exactly with frequencyofints and merged into the
+	summary, which is then reduced by subtracting the (k+1)th largest
+	count from all and dropping the non positive ones. Summaries of
+	different parts of the data (eg. in several processes) are merged 
+	the same way with merge, keeping the bound.
+
+	args:
+		k : int, mandatory
+			number of counters
+		chunks: iterable of integer arrays, optional, defaults to ()
+			chunks counted at once
+	example_usage:
+		>>> hitters = su.HeavyHitters(2)
+		>>> for chunk in ([1, 7, 7, 3], [7, 1, 7, 4], [7, 1, 5]):
+		...	hitters.update(chunk)
+		>>> vals, freq = hitters.top(1)
+		>>> vals.tolist(), freq.tolist(), hitters.errorbound
+		([7], [2], 3)
+	"""
+	def __init__(self, k, chunks=()):
+		if k <= 0:
+			raise ValueError("k must be positive")
+		self.k = k
+		self.n = 0
+		# the tables take the type of the first chunk
+		self.vals = None
+		self.freq = None
+		for chunk in chunks:
+			self.update(chunk)
+
+	def update(self, chunk):
+		"""
+		count the integers of the array chunk
+		"""
+		chunk = np.asarray(chunk).ravel()
+		vals, freq = frequencyofints(chunk)
+		self._add(vals, freq, len(chunk))
+
+	def _add(self, vals, freq, n):
+		if self.vals is None:
+			self.vals, self.freq = vals[:0], freq[:0]
+		self.vals, self.freq = _mergecounts((self.vals, vals), 
+			(self.freq, freq))
+		self.n += n
+		if len(self.freq) > self.k:
+			cut = len(self.freq) - self.k - 1
+			excess = np.partition(self.freq, cut)[cut]
+			keep = self.freq > excess
+			self.vals = self.vals[keep]
+			self.freq = self.freq[keep] - excess
+
+	def merge(self, other):
+		"""
+		add the summary of the HeavyHitters other to this one
+		"""
+		if other.vals is not None:
+			self._add(other.vals, other.freq, other.n)
+
+	@property
+	def errorbound(self):
+		"""
+		largest difference between the frequency of an integer and its
+		count in the summary (0 if it is not in it)
+		"""
+		return int(self.n - self.result()[1].sum()) // (self.k + 1)
+
+	def result(self):
+		"""
+		return the tuple (vals, freq) of the integers kept, in 
+		increasing order, and their counts
+		"""
+		if self.vals is None:
+			return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.intp)
+		return self.vals, self.freq
+
+	def top(self, k):
+		"""
+		return the tuple (vals, freq) of the k integers with the 
+		largest counts, in decreasing order of count
+		"""
+		return _topk(*self.result(), k=k)
+
+
+def _partition(A, B, chunksize):
+	"""
+	return the arrays (sa, sb) of the boundaries of the partitions of the
+	sorted arrays A and B into pieces A[sa[k]:sa[k+1]], B[sb[k]:sb[k+1]] 
+	of about chunksize elements each, split at common keys so that equal
+	keys of A and B always fall in the same partition
+	"""
+	keys = np.concatenate((A[chunksize::chunksize], B[chunksize::chunksize]))
+	keys = np.unique(keys)
+	sa = np.concatenate(([0], np.searchsorted(A, keys, 'left'), [len(A)]))
+	sb = np.concatenate(([0], np.searchsorted(B, keys, 'left'), [len(B)]))
+	return sa, sb
+
+
+def _mergejoin(A, B):
+	"""
+	return the index arrays (inA, inB, CA, CB) of the elements of the
+	sorted array A not in B, of B not in A, and the pairs (CA[k], CB[k])
+	of indices of equal elements of A and B
+	"""
+	lo = np.searchsorted(B, A, 'left')
+	cnt = np.searchsorted(B, A, 'right') - lo
+	inA = np.flatnonzero(cnt == 0)
+	CA = np.repeat(np.arange(len(A)), cnt)
+	# every element of A is paired with the run B[lo:lo + cnt] of equal
+	# elements of B
+	first = np.cumsum(cnt) - cnt
+	CB = np.repeat(lo - first, cnt) + np.arange(len(CA))
+	notinA = np.ones(len(B), dtype=bool)
+	notinA[CB] = False
+	return inA, np.flatnonzero(notinA), CA, CB
+
+
+def itercommonsortedLists(A, B, chunksize):
+	"""
+	iterate over the partitions of the sorted arrays A and B into pieces of
+	about chunksize elements split at common keys, and yield for each the
+	index arrays (inA, inB, CA, CB) of findcommonsortedLists(A, B,
+	returnelements=False) which fall in it, so that only a partition 
+	of A and B has to be in memory at a time. A and B may be memory 
+	mapped arrays.
+
+	args:
+		A : sorted array, mandatory
+		B : sorted array, mandatory
+		chunksize : int, mandatory
+			number of elements of A and of B in a partition,
+			more if it splits a run of equal keys
+	returns:
+		generator of tuples of index arrays into A and B
+	example_usage:
+		>>> A = np.array([1, 2, 4, 4, 6, 8])
+		>>> B = np.array([2, 3, 4, 8, 9])
+		>>> for inA, inB, CA, CB in su.itercommonsortedLists(A, B, 2):
+		...	print((CA.tolist(), CB.tolist()))
+		([1], [0])
+		([2, 3], [2, 2])
+		([5], [3])
+		([], [])
+	"""
+	A = np.asarray(A)
+	B = np.asarray(B)
+	sa, sb = _partition(A, B, chunksize)
+	for k in range(len(sa) - 1):
+		inA, inB, CA, CB = _mergejoin(A[sa[k]:sa[k+1]], B[sb[k]:sb[k+1]])
+		yield inA + sa[k], inB + sb[k], CA + sa[k], CB + sb[k]
+
+
 def findcommonsortedLists(A ,  B , 
 	commononly= True, 
 	inAnotB =None, 
 	both = None, 
-	returnelements = True):
+	returnelements = True,
+	chunksize = None):
 	
 	"""
 	Fast method of finding common numbers in presorted (ascending) 
-	iterables A and B with unique elements, as well as elements in 
-	A that are not in B or vice-versa.
+	iterables A and B, as well as elements in A that are not in B 
+	or vice-versa, by a vectorized merge join of A and B with 
+	np.searchsorted.
 	args:
-
+		A : sorted array, mandatory
+		B : sorted array, mandatory
+		commononly, inAnotB, both : unused, kept for compatibility
+		returnelements : bool, optional, defaults to True
+			if True, return the elements, otherwise the indices
+		chunksize : int, optional, defaults to None
+			if not None, join A and B in partitions of about 
+			chunksize elements (see itercommonsortedLists) to 
+			bound the memory of the temporaries 
 	returns:
-
+		if returnelements, the tuple of arrays (rA, rB, rC) of the
+		elements of A not in B, of B not in A and the common
+		elements; otherwise the tuple of index arrays 
+		(inA, inB, CA, CB) such that A[inA] are the elements of A not
+		in B, B[inB] those of B not in A, and A[CA] == B[CB] the
+		common elements. With duplicate keys, every pair of equal
+		elements of A and B is in (CA, CB), as in a join.
 	Status: 
-		
+		Vectorized, tests in test_sorting.py
+	example_usage:
+		>>> A = np.array([1, 2, 4, 4, 6])
+		>>> B = np.array([2, 3, 4, 8])
+		>>> rA, rB, rC = su.findcommonsortedLists(A, B)
+		>>> rA.tolist(), rB.tolist(), rC.tolist()
+		([1, 6], [3, 8], [2, 4, 4])
+		>>> inA, inB, CA, CB = su.findcommonsortedLists(A, B, 
+		...	returnelements=False)
+		>>> CA.tolist(), CB.tolist()
+		([1, 2, 3], [0, 2, 2])
+
 	Notes:
 		This should be used for large presorted lists/iterable 
 		where ordering is used to find such elements faster than 
-		more general methods.
+		more general methods: it takes O((lenA + lenB) log) operations,
+		all in numpy.
 
 	Assumptions
-	A and B are iterables that can be indexed by A[i] and have unique 
-	float entries that are pre-sorted to be in ascending order. 
+	A and B are arrays (or sequences) sorted in ascending order. 
 	
 	"""
-	
-	inA = []
-	inB = []
-	CA   = []
-	CB = [] 
-	indA = 0 
-	indB = 0
-    
-	lenA = len(A)
-	lenB = len(B)
-	
-	while indA < lenA and indB < lenB :
-		
-		if A[indA] > B[indB]:
-            
-			inB.append(indB)
-			indB += 1
-	   
-		elif A[indA] < B[indB]:
-			
-			inA.append(indA)
-			indA += 1
-		
-		elif A[indA] == B[indB]:
-			
-			CA.append(indA)
-			CB.append(indB)
-			indA += 1
-			indB += 1
-		
-		else :
-			raise ValueError("How is that possible with", 
-				"integers?\n")
-		
-	for i in range(indA , lenA -1):
-		inA.append(indA)
-
-	for i in range(indB , lenB -1 ):
-		inB.append(indB)
-		
+	A = np.asarray(A)
+	B = np.asarray(B)
+	if chunksize is None:
+		inA, inB, CA, CB = _mergejoin(A, B)
+	else:
+		parts = list(itercommonsortedLists(A, B, chunksize))
+		inA, inB, CA, CB = [np.concatenate(x) for x in zip(*parts)]
 		
 	if returnelements:
-		rA = A[inA]
-		rB = B[inB] 
-		rC = A[CA] 
-		
-	return rA, rB , rC 
+		return A[inA], B[inB], A[CA]
+	return inA, inB, CA, CB
+
+
+def _joinpartition(task):
+	"""
+	join the partition A[sa0:sa1], B[sb0:sb1] of the sorted arrays saved
+	in the .npy files fnameA, fnameB, memory mapped, and return the index
+	arrays of _mergejoin as indices into the whole arrays
+	"""
+	fnameA, fnameB, sa0, sa1, sb0, sb1 = task
+	A = np.load(fnameA, mmap_mode='r')
+	B = np.load(fnameB, mmap_mode='r')
+	inA, inB, CA, CB = _mergejoin(A[sa0:sa1], B[sb0:sb1])
+	return inA + sa0, inB + sb0, CA + sa0, CB + sb0
+
+
+def parallelfindcommonsortedLists(A, B, 
+	workers = 4,
+	chunksize = None,
+	returnelements = True,
+	tmpdir = None):
+
+	"""
+	findcommonsortedLists in a pool of workers processes: A and B are 
+	split at common keys into partitions (see itercommonsortedLists)
+	which are joined by the workers, and the index arrays of the
+	partitions are merged into global index arrays. The workers read 
+	A and B from memory mapped .npy files rather than having them
+	pickled.
+
+	args:
+		A : sorted array or name of a .npy file of one, mandatory
+			arrays are saved to a temporary .npy file, so large
+			inputs are better passed as files
+		B : sorted array or name of a .npy file of one, mandatory
+		workers : int, optional, defaults to 4
+			number of processes
+		chunksize : int, optional, defaults to None
+			number of elements of A and of B in a partition, by
+			default such that there are about 4 partitions per
+			worker
+		returnelements : bool, optional, defaults to True
+			if True, return the elements, otherwise the indices
+		tmpdir : string, optional, defaults to None
+			directory of the temporary .npy files, by default 
+			that of tempfile
+	returns:
+		same as findcommonsortedLists
+	example_usage:
+		>>> np.save(fname, np.sort(ids)) # doctest: +SKIP
+		>>> inA, inB, CA, CB = su.parallelfindcommonsortedLists(fname,
+		...	otherfname, workers=16, returnelements=False) # doctest: +SKIP
+	"""
+	import multiprocessing
+
+	fnames = []
+	tempdir = None
+	try:
+		for X in (A, B):
+			if isinstance(X, (bytes, type(u''))):
+				fnames.append(X)
+				continue
+			if tempdir is None:
+				tempdir = tempfile.mkdtemp(dir=tmpdir)
+			fnames.append(os.path.join(tempdir, '%d.npy' % len(fnames)))
+			np.save(fnames[-1], np.asarray(X))
+		A = np.load(fnames[0], mmap_mode='r')
+		B = np.load(fnames[1], mmap_mode='r')
+		if chunksize is None:
+			chunksize = -(-max(len(A), len(B), 1) // (4 * workers))
+		sa, sb = _partition(A, B, chunksize)
+		tasks = [(fnames[0], fnames[1], sa[k], sa[k+1], sb[k], sb[k+1])
+			for k in range(len(sa) - 1)]
+		if workers > 1 and len(tasks) > 1:
+			pool = multiprocessing.Pool(min(workers, len(tasks)))
+			try:
+				results = pool.map(_joinpartition, tasks)
+			finally:
+				pool.close()
+				pool.join()
+		else:
+			results = [_joinpartition(task) for task in tasks]
+		inA, inB, CA, CB = [np.concatenate(x) for x in zip(*results)]
+		if returnelements:
+			return A[inA], B[inB], A[CA]
+		return inA, inB, CA, CB
+	finally:
+		if tempdir is not None:
+			shutil.rmtree(tempdir, ignore_errors=True)
+
+
+class SortedIndex(object):
+	"""
+	index of an array for repeated vectorized lookups by binary search 
+	(np.searchsorted) in its sorted values, built once. Indices returned
+	are indices into the original array: if it was not sorted, the 
+	permutation sorting it (a stable argsort) is kept. The index can be
+	saved to a directory of .npy files and loaded memory mapped, so that
+	worker processes share the pages of a single copy: an index loaded 
+	with a mmap_mode pickles as its directory name.
+
+	args:
+		values : array, mandatory
+		presorted : bool, optional, defaults to False
+			if True, values are already in ascending order and no
+			permutation is computed
+	example_usage:
+		>>> index = su.SortedIndex(np.array([40, 10, 30, 10, 20]))
+		>>> index.contains([10, 15, 40]).tolist()
+		[True, False, True]
+		>>> index.locate([30, 10, 15]).tolist()
+		[2, 1, -1]
+		>>> sorted(index.range_query(10, 30).tolist())
+		[1, 3, 4]
+		>>> index.count_in_range([10, 0], [30, 100]).tolist()
+		[3, 5]
+	"""
+	def __init__(self, values, presorted=False):
+		values = np.asarray(values)
+		if presorted:
+			self.perm = None
+			self.keys = values
+		else:
+			self.perm = np.argsort(values, kind='mergesort')
+			self.keys = values[self.perm]
+		self.dirname = None
+		self.mmap_mode = None
+
+	def __len__(self):
+		return len(self.keys)
+
+	def _indices(self, pos):
+		if self.perm is None:
+			return pos
+		return self.perm[pos]
+
+	def _search(self, x):
+		x = np.asarray(x)
+		pos = np.searchsorted(self.keys, x, 'left')
+		found = pos < len(self.keys)
+		found[found] = self.keys[pos[found]] == x[found]
+		return pos, found
+
+	def contains(self, x):
+		"""
+		return the boolean array of whether each of the values x is in 
+		the index
+		"""
+		return self._search(np.atleast_1d(x))[1]
+
+	def locate(self, x, missing=-1):
+		"""
+		return the array of the indices in the original array of the 
+		first occurrence of each of the values x, or missing for the
+		values which are not in it
+		"""
+		pos, found = self._search(np.atleast_1d(x))
+		indices = np.full(len(pos), missing, dtype=np.intp)
+		indices[found] = self._indices(pos[found])
+		return indices
+
+	def range_query(self, lo, hi):
+		"""
+		return the indices in the original array of the values v such
+		that lo <= v < hi, in the order of the values
+		"""
+		start, stop = np.searchsorted(self.keys, [lo, hi], 'left')
+		if self.perm is None:
+			return np.arange(start, max(start, stop))
+		return np.array(self.perm[start:max(start, stop)])
+
+	def count_in_range(self, lo, hi):
+		"""
+		return the numbers of values v such that lo <= v < hi, for 
+		arrays lo, hi of bounds
+		"""
+		counts = (np.searchsorted(self.keys, hi, 'left') - 
+			np.searchsorted(self.keys, lo, 'left'))
+		return np.maximum(counts, 0)
+
+	def save(self, dirname):
+		"""
+		save the index to the directory dirname, as the .npy files
+		keys.npy and, if the values were not presorted, perm.npy
+		"""
+		if not os.path.isdir(dirname):
+			os.makedirs(dirname)
+		permname = os.path.join(dirname, 'perm.npy')
+		if self.perm is not None:
+			np.save(permname, self.perm)
+		elif os.path.exists(permname):
+			os.remove(permname)
+		np.save(os.path.join(dirname, 'keys.npy'), self.keys)
+
+	@classmethod
+	def load(cls, dirname, mmap_mode='r'):
+		"""
+		load the index saved to the directory dirname, memory mapped
+		unless mmap_mode is None
+		"""
+		index = cls.__new__(cls)
+		index.keys = np.load(os.path.join(dirname, 'keys.npy'), 
+			mmap_mode=mmap_mode)
+		permname = os.path.join(dirname, 'perm.npy')
+		index.perm = None
+		if os.path.exists(permname):
+			index.perm = np.load(permname, mmap_mode=mmap_mode)
+		index.dirname = dirname
+		index.mmap_mode = mmap_mode
+		return index
+
+	def __reduce_ex__(self, protocol):
+		if self.dirname is not None and self.mmap_mode is not None:
+			return _loadsortedindex, (self.dirname, self.mmap_mode)
+		return object.__reduce_ex__(self, protocol)
+
+
+def _loadsortedindex(dirname, mmap_mode):
+	return SortedIndex.load(dirname, mmap_mode)
 
 
 if __name__ == "__main__":
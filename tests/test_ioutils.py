@@ -0,0 +1,586 @@
+#!/usr/bin/env python
+
+import gzip
+import os
+import threading
+import time
+import numpy as np
+import pytest
+import utils.ioutils as io
+
+fitres = """# header comment
+VARNAMES: CID IDSURVEY z FITPROB
+SN: 1001 4 0.10 0.50 # first
+SN: 1002 4 0.20 0.01
+
+SN: abc3 5 0.3e0 0.9
+"""
+
+
+def writefile(tmpdir, name, text):
+    fname = str(tmpdir.join(name))
+    if fname.endswith('.gz'):
+        f = gzip.open(fname, 'wb')
+    else:
+        f = open(fname, 'wb')
+    f.write(text.encode('ascii'))
+    f.close()
+    return fname
+
+
+def test_loadfile2array_columns(tmpdir):
+    fname = writefile(tmpdir, 'test.FITRES', fitres)
+    data, coldict, ret = io.loadfile2array(fname, datastrings=['SN:'],
+        ignorecols=[0], usecoldicts=[1], converttofloat=True)
+    assert ret == 0
+    assert data.dtype.names == ('f0', 'f1', 'f2', 'f3')
+    assert data['f1'].dtype == np.dtype('i8')
+    assert data['f2'].dtype == np.dtype('f8')
+    assert data['f0'].dtype == np.dtype('S4')
+    assert list(data['f0']) == [b'1001', b'1002', b'abc3']
+    np.testing.assert_allclose(data['f3'], [0.5, 0.01, 0.9], rtol=1e-6)
+    assert coldict[b'abc3'] == 2
+
+
+def test_loadfile2array_gz_and_delims(tmpdir):
+    fname = writefile(tmpdir, 'test.FITRES.gz', fitres)
+    data, coldict, ret = io.loadfile2array(fname, extension='gz',
+        datastrings=['SN:'], usecols=[2, 3], keys=['IDSURVEY', 'z'],
+        converttofloat=True)
+    assert list(data['IDSURVEY']) == [4, 4, 5]
+    fname = writefile(tmpdir, 'test.csv', "a, b ,c\n1,2, 3\n 4 ,,6\n#x\n")
+    table, coldict, ret = io.loadfile2array(fname, datadelims=',')
+    assert table == [['a', 'b', 'c'], ['1', '2', '3'], ['4', '', '6']]
+    table, coldict, ret = io.loadfile2array(fname, datadelims=',',
+        ignorelines=[1])
+    assert table[0] == ['1', '2', '3']
+
+
+def test_loadfile2array_validate(tmpdir):
+    fname = writefile(tmpdir, 'bad.txt', "1 2 3\n4 5\n")
+    assert io.loadfile2array(fname)[-1] == 1
+    table, coldict, ret = io.loadfile2array(fname, validatetable=False)
+    assert table[1] == ['4', '5', '']
+
+
+def test_iterfile2array(tmpdir):
+    fname = writefile(tmpdir, 'test.FITRES', fitres)
+    data = io.loadfile2array(fname, datastrings=['SN:'], usecols=[2, 3],
+        converttofloat=True)[0]
+    chunks = list(io.iterfile2array(fname, chunksize=2,
+        datastrings=['SN:'], usecols=[2, 3]))
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    assert all(chunk.dtype == data.dtype for chunk in chunks)
+    assert (np.concatenate(chunks) == data).all()
+    schema = [('IDSURVEY', 'i4'), ('z', 'f8')]
+    chunks = list(io.iterfile2array(fname, chunksize=10,
+        datastrings=['SN:'], usecols=[2, 3], dtype=schema))
+    assert chunks[0].dtype == np.dtype(schema)
+
+
+def test_guesscolumntype():
+    column = np.array([b'1001', b'1002', b'1003', b'abc3'])
+    assert io.guesscolumntype(column) == 'S4'
+    assert io.guesscolumntype(column, nsample=2) == 'S4'
+    assert io.guesscolumntype(column[:3], nsample=2) == 'i8'
+    assert io.guesscolumntype(['1', '1e3', '2'], nsample=1) == 'f8'
+    assert io.guessarraytype(['1', '1e3', '2']) == 'f4'
+    assert io.getdatatypes([[b'a', b'1'], [b'bb', b'2.5']]) == [
+        ('f0', 'S2'), ('f1', 'f8')]
+
+
+def test_tablecache(tmpdir):
+    fname = writefile(tmpdir, 'test.FITRES', fitres)
+    cache = io.TableCache(str(tmpdir.join('cache')))
+    args = dict(datastrings=['SN:'], ignorecols=[0], usecoldicts=[1],
+                converttofloat=True, cache=cache)
+    data, coldict, ret = io.loadfile2array(fname, **args)
+    cached, cachedcoldict, ret = io.loadfile2array(fname, **args)
+    assert isinstance(cached, np.memmap)
+    assert (cached == data).all() and cachedcoldict == coldict
+    assert len(cache._entries()) == 1
+    io.loadfile2array(fname, datastrings=['SN:'], converttofloat=True,
+                      cache=cache)
+    assert len(cache._entries()) == 2
+    cache.maxbytes = 1
+    cache.evict()
+    assert len(cache._entries()) == 0
+    io.loadfile2array(fname, **args)
+    cache.invalidate(fname)
+    assert len(cache._entries()) == 0
+    # threads caching the same table at once
+    cache.maxbytes = 2**30
+    import multiprocessing.pool
+    pool = multiprocessing.pool.ThreadPool(8)
+    try:
+        pool.map(lambda i: cache.save('same', data, coldict), range(64))
+    finally:
+        pool.close()
+        pool.join()
+    assert (cache.load('same')[0] == data).all()
+    assert sorted(os.listdir(cache.cachedir)) == ['same.npy', 'same.npz']
+
+
+def test_loadfixedwidth2array(tmpdir):
+    text = ("# id    ra      dec   name\n"
+            "  1   10.5   -3.25   alpha\n"
+            "  2  110.0    4.50   beta \n"
+            " 31    0.1   10.00   c    \n")
+    for name, contents in [('even.dat', text),
+                           ('ragged.dat', text.replace('beta \n', 'beta\n'))]:
+        fname = writefile(tmpdir, name, contents)
+        data, colspecs = io.loadfixedwidth2array(fname,
+            keys=['id', 'ra', 'dec', 'name'])
+        assert colspecs == [(1, 3), (5, 10), (13, 18), (21, 26)]
+        assert list(data['id']) == [1, 2, 31]
+        assert list(data['name']) == [b'alpha', b'beta', b'c']
+        np.testing.assert_allclose(data['dec'], [-3.25, 4.5, 10.])
+
+
+def test_loadfile2array_workers(tmpdir):
+    lines = ['# comment'] + ['SN: %d %d.5' % (i, i) for i in range(1000)]
+    fname = writefile(tmpdir, 'big.txt', '\n'.join(lines) + '\n')
+    args = dict(datastrings=['SN:'], ignorelines=[2, 500, 1001],
+                ignorecols=[0], converttofloat=True)
+    data = io.loadfile2array(fname, **args)[0]
+    pdata = io.loadfile2array(fname, workers=3, **args)[0]
+    assert len(data) == 997
+    assert (data == pdata).all()
+    fname = writefile(tmpdir, 'bad.txt', '1 2\n' * 500 + '1 2 3\n' + '1 2\n')
+    assert io.loadfile2array(fname, workers=3)[-1] == 1
+
+
+def test_loadfiles2array(tmpdir):
+    fnames = [writefile(tmpdir, 'a.FITRES', fitres),
+              writefile(tmpdir, 'empty.FITRES', '# nothing\n'),
+              writefile(tmpdir, 'b.FITRES', 'SN: 7 6 0.5 0.5\n')]
+    for workers, threads in [(1, False), (2, False), (2, True)]:
+        data = io.loadfiles2array(fnames, datastrings=['SN:'],
+            ignorecols=[0], keys=['CID', 'IDSURVEY', 'z', 'FITPROB'],
+            sourcecol='file', workers=workers, threads=threads)
+        assert list(data['file']) == [0, 0, 0, 2]
+        assert data['CID'].dtype.kind == 'S'
+        assert list(data['IDSURVEY']) == [4, 4, 5, 6]
+    # no rows at all, as with loadfile2array
+    schema = [('CID', 'S8'), ('z', 'f8')]
+    data = io.loadfiles2array(fnames[1:2], datastrings=['SN:'],
+                              usecols=[1, 3], dtype=schema)
+    assert len(data) == 0 and data.dtype == np.dtype(schema)
+    data = io.loadfiles2array(fnames[1:2], datastrings=['SN:'],
+                              usecols=[1, 3], dtype=schema, sourcecol='file')
+    assert len(data) == 0 and data.dtype.names == ('CID', 'z', 'file')
+
+
+def test_loadfile2array_compressed(tmpdir):
+    import bz2
+    fname = writefile(tmpdir, 'test.FITRES', fitres)
+    data = io.loadfile2array(fname, datastrings=['SN:'],
+                             converttofloat=True)[0]
+    # gzip streams and bzip2 are recognized from their first bytes
+    gzname = str(tmpdir.join('test.FITRES.gz'))
+    f = open(gzname, 'wb')
+    for text in fitres.split('\n\n'):
+        g = gzip.GzipFile(fileobj=f, mode='wb')
+        g.write((text + '\n').encode('ascii'))
+        g.close()
+    f.close()
+    bz2name = str(tmpdir.join('test.FITRES.bz2'))
+    f = open(bz2name, 'wb')
+    f.write(bz2.compress(fitres.encode('ascii')))
+    f.close()
+    for name in [gzname, bz2name]:
+        compressed = io.loadfile2array(name, datastrings=['SN:'],
+                                       converttofloat=True)[0]
+        assert (compressed == data).all()
+    chunks = list(io.iterfile2array(bz2name, chunksize=1,
+                                    datastrings=['SN:'], usecols=[2, 3]))
+    assert len(chunks) == 3
+    assert io.loadfile2array(bz2name, extension='zip') == 1
+    # concatenated bzip2 streams (as from pbzip2), one ending at the end
+    # of a read
+    first = bz2.compress(b'SN: 1 2\n')
+    f = open(bz2name, 'wb')
+    f.write(first + bz2.compress(b'SN: 3 4\n'))
+    f.close()
+    for blocksize in (len(first), 1 << 20):
+        stream = io._DecompressedFile(open(bz2name, 'rb'),
+                                      bz2.BZ2Decompressor,
+                                      blocksize=blocksize)
+        try:
+            pieces = [stream.read(4)]
+            while pieces[-1]:
+                pieces.append(stream.read(4))
+            assert b''.join(pieces) == b'SN: 1 2\nSN: 3 4\n'
+        finally:
+            stream.close()
+        stream = io._DecompressedFile(open(bz2name, 'rb'),
+                                      bz2.BZ2Decompressor,
+                                      blocksize=blocksize)
+        try:
+            assert stream.read() == b'SN: 1 2\nSN: 3 4\n'
+            assert stream.read() == b''
+        finally:
+            stream.close()
+
+
+def test_loadfile2array_prunes_first_block(tmpdir, monkeypatch):
+    text = '# a comment\n' + ''.join('%d %d %d\n' % (i, 2 * i, 3 * i)
+                                       for i in range(20000))
+    fname = writefile(tmpdir, 'table.txt', text)
+    tokenized = []
+    tokenizeblock = io.Tokenizer.tokenizeblock
+
+    def spy(self, data, *args, **kwargs):
+        tokenized.append(len(data))
+        return tokenizeblock(self, data, *args, **kwargs)
+
+    monkeypatch.setattr(io.Tokenizer, 'tokenizeblock', spy)
+    data = io.loadfile2array(fname, usecols=[2], converttofloat=True)[0]
+    assert (data['f0'] == 3 * np.arange(20000)).all()
+    # only the start of the file is fully tokenized, for the first row
+    assert 0 < sum(tokenized) < len(text) // 4
+
+
+def test_tokenizer():
+    tokenizer = io.Tokenizer(delimiters=[',', '::'], ignorestrings=['#', '//'])
+    lines = ['1, 2::3 # c', '// comment', '', '4::5,6']
+    assert tokenizer.tokenize(lines) == [['1', '2', '3'], ['4', '5', '6']]
+    assert [tokenizer.tokenizeline(line)[0] for line in lines] == [
+        ['1', '2', '3'], [], [], ['4', '5', '6']]
+    columns = tokenizer.columns('\n'.join(lines), cols=[2])
+    assert list(columns[0]) == [b'3', b'6']
+
+
+def test_loadfile2array_multiple_delims(tmpdir):
+    fname = writefile(tmpdir, 'test.txt', "1,2;3\n4;5,6\n")
+    table = io.loadfile2array(fname, datadelims=[',', ';'])[0]
+    assert table == [['1', '2', '3'], ['4', '5', '6']]
+
+
+def test_columnindex(tmpdir):
+    fname = writefile(tmpdir, 'test.FITRES', fitres)
+    data = io.loadfile2array(fname, datastrings=['SN:'], ignorecols=[0],
+        keys=['CID', 'IDSURVEY', 'z', 'FITPROB'], converttofloat=True)[0]
+    index = io.ColumnIndex.forfile(fname, data, ['CID'])
+    assert list(index.lookup([b'abc3', b'nope', b'1001'])) == [2, -1, 0]
+    assert tmpdir.join('test.FITRES.CID.idx.npz').check()
+    index = io.ColumnIndex.forfile(fname, data, ['CID'])
+    assert list(index.lookup([b'1002'])) == [1]
+    # an index of other rows of the file is not reused
+    cut = io.loadfile2array(fname, datastrings=['SN:'], ignorecols=[0],
+        keys=['CID', 'IDSURVEY', 'z', 'FITPROB'], where='z > 0.15',
+        converttofloat=True)[0]
+    index = io.ColumnIndex.forfile(fname, cut, ['CID'])
+    assert list(index.lookup([b'abc3', b'1001'])) == [1, -1]
+    index = io.ColumnIndex.forfile(fname, data, ['CID'])
+    assert list(index.lookup([b'abc3', b'1001'])) == [2, 0]
+    index = io.ColumnIndex(data['IDSURVEY'], data['CID'])
+    index.save(str(tmpdir.join('composite.npz')))
+    index = io.ColumnIndex.load(str(tmpdir.join('composite.npz')))
+    assert list(index.lookup([5, 4, 4], [b'abc3', b'abc3', b'1002'])) == [
+        2, -1, 1]
+
+
+def test_loadfile2array_header(tmpdir):
+    fname = writefile(tmpdir, 'test.FITRES', fitres)
+    data, coldict, ret = io.loadfile2array(fname, header='VARNAMES:',
+        usecols=['z', 'CID'], usecoldicts=['CID'], converttofloat=True)
+    assert data.dtype.names == ('CID', 'z')
+    assert coldict[b'1002'] == 1
+    data = io.loadfile2array(fname, header='VARNAMES:', ignorecols=[0],
+                             converttofloat=True)[0]
+    assert data.dtype.names == ('CID', 'IDSURVEY', 'z', 'FITPROB')
+    # without datastrings the header line is not a row
+    fname = writefile(tmpdir, 'test.txt', "a b c\n1 2 3\n4 5 6\n")
+    data = io.loadfile2array(fname, header='a', usecols=['c'],
+                             converttofloat=True)[0]
+    assert list(data['c']) == [3, 6]
+    chunks = list(io.iterfile2array(fname, header='a', ignorecols=['b']))
+    assert chunks[0].dtype.names == ('a', 'c')
+    data = io.loadfiles2array([fname, fname], header='a', usecols=['b'])
+    assert list(data['b']) == [2, 5, 2, 5]
+
+
+def test_loadfile2array_where(tmpdir):
+    fname = writefile(tmpdir, 'test.FITRES', fitres)
+    data, coldict, ret = io.loadfile2array(fname, header='VARNAMES:',
+        usecols=['CID', 'z', 'FITPROB'], usecoldicts=['CID'],
+        where='z < 0.25 & FITPROB > 0.1 | CID == "abc3"',
+        converttofloat=True)
+    assert list(data['CID']) == [b'1001', b'abc3']
+    assert coldict[b'abc3'] == 1
+    data = io.loadfile2array(fname, datastrings=['SN:'], usecols=[2, 3],
+        where='~(0.15 < f1 < 0.25)', converttofloat=True)[0]
+    assert list(data['f0']) == [4, 5]
+    data = io.loadfile2array(fname, datastrings=['SN:'], usecols=[3],
+        where='f0 > 1', converttofloat=True)[0]
+    assert len(data) == 0
+    chunks = list(io.iterfile2array(fname, chunksize=1, header='VARNAMES:',
+        usecols=['z', 'FITPROB'], where='abs(log10(FITPROB)) < 1'))
+    assert [list(chunk['z']) for chunk in chunks] == [[0.1], [0.3]]
+    data = io.loadfiles2array([fname, fname], datastrings=['SN:'],
+        usecols=[2, 3], keys=['IDSURVEY', 'z'], where='IDSURVEY == 5')
+    assert list(data['z']) == [0.3, 0.3]
+    with pytest.raises(KeyError):
+        io.loadfile2array(fname, datastrings=['SN:'], where='mu > 1')
+    with pytest.raises(SyntaxError):
+        io.loadfile2array(fname, datastrings=['SN:'], where='f0.__class__')
+
+
+def test_loadfile2array_dtype(tmpdir):
+    fname = writefile(tmpdir, 'test.FITRES', fitres)
+    schema = [('CID', 'S8'), ('z', 'f4')]
+    data, coldict, ret = io.loadfile2array(fname, datastrings=['SN:'],
+        usecols=[1, 3], usecoldicts=[1], dtype=schema, converttofloat=True)
+    assert data.dtype == np.dtype(schema)
+    assert list(data['CID']) == [b'1001', b'1002', b'abc3']
+    assert coldict[b'1002'] == 1
+    schemafile = str(tmpdir.join('test.schema'))
+    io.saveschema(schemafile, data)
+    assert io.loadschema(schemafile) == data.dtype
+    big = writefile(tmpdir, 'big.txt',
+                    ''.join('%d %d\n' % (i, i * i) for i in range(5000)))
+    for workers in (1, 2):
+        data = io.loadfile2array(big, usecols=[1], dtype=[('sq', 'i8')],
+            converttofloat=True, workers=workers)[0]
+        assert (data['sq'] == np.arange(5000) ** 2).all()
+    with pytest.raises(ValueError):
+        io.loadfile2array(fname, datastrings=['SN:'], usecols=[1],
+                          dtype=[('CID', 'i8')], converttofloat=True)
+    assert io.loadfile2array(writefile(tmpdir, 'bad.txt', "1 2\n3\n"),
+        dtype=[('a', 'i8'), ('b', 'i8')], converttofloat=True)[-1] == 1
+
+
+def test_where_string_columns(tmpdir):
+    fname = writefile(tmpdir, 'test.FITRES', fitres)
+    numeric = writefile(tmpdir, 'numeric.FITRES',
+                        fitres.replace('abc3', '1003'))
+    schema = [('CID', 'S8'), ('z', 'f8')]
+    for dtype in (schema, None):
+        for name in (fname, numeric):
+            data = io.loadfile2array(name, datastrings=['SN:'],
+                                     usecols=[1, 3], keys=['CID', 'z'],
+                                     dtype=dtype, where='CID == "1002"',
+                                     converttofloat=True)[0]
+            assert data['z'].tolist() == [0.2]
+    data = io.loadfile2array(fname, datastrings=['SN:'], usecols=[1, 3],
+                             dtype=schema, where='CID != "1002" & z > 0.15',
+                             converttofloat=True)[0]
+    assert data['CID'].tolist() == [b'abc3']
+    chunks = list(io.iterfile2array(fname, datastrings=['SN:'], usecols=[1],
+                                    dtype=[('CID', 'S8')],
+                                    where='CID == "1001"'))
+    assert [chunk['CID'].tolist() for chunk in chunks] == [[b'1001']]
+
+
+def test_paramfile(tmpdir):
+    fname = writefile(tmpdir, 'params.ini', "# cosmology\nh = 0.7\n"
+                      "n = 3 # count\n# end\nroot = out/run = 1\n"
+                      "# cosmology\nw = -1\n")
+    assert io.builddict(fname) == {'h': '0.7', 'n': '3', 'root': 'out/run',
+                                   'w': '-1'}
+    params = io.ParamFile(fname)
+    assert params.block('# cosmology', '# end') == {'h': 0.7, 'n': 3,
+                                                    'w': -1}
+    assert params.blockranges('# cosmology', '# end') == [(0, 2), (3, 4)]
+    assert io.builddict(fname, typed=True)['root'] == 'out/run'
+    writefile(tmpdir, 'params.ini', "h = 0.67\n")
+    assert io.builddict(fname) == {'h': '0.67'}
+
+
+def _oldbuilddict(fname, ignorestrings=['#'], dictdelim='='):
+    # the line by line reader builddict replaced
+    paramdict = {}
+    with open(fname) as f:
+        for line in f:
+            tmp = line.strip()
+            cuts = [tmp.find(st) for st in ignorestrings if st in tmp]
+            if len(cuts) > 0:
+                tmp = tmp[:min(cuts)]
+            tokens = tmp.split(dictdelim) if dictdelim else tmp.split()
+            if len(tokens) > 1:
+                paramdict[tokens[0].strip()] = tokens[1].strip()
+    return paramdict
+
+
+@pytest.mark.parametrize('dictdelim', ['=', ' ', ''])
+def test_builddict_matches_old_reader(dictdelim):
+    fname = os.path.join(os.path.dirname(io.__file__), 'example_data',
+                         'indat.params')
+    assert io.builddict(fname, dictdelim=dictdelim) == _oldbuilddict(
+        fname, dictdelim=dictdelim)
+
+
+def test_paramfile_indented(tmpdir):
+    fname = writefile(tmpdir, 'params.ini', "  a = 1\nVIZ  \n\tb  2 # c\n")
+    assert io.builddict(fname, dictdelim=' ') == {'a': '=', 'b': ''}
+    assert io.builddict(fname) == {'a': '1'}
+    assert io.builddict(fname, dictdelim='') == {'a': '=', 'b': '2'}
+    assert not hasattr(io.ParamFile(fname), '_buf')
+
+
+def test_configstore(tmpdir):
+    base = writefile(tmpdir, 'base.ini', "h = 0.7\nn = 3\nname = base\n")
+    run = writefile(tmpdir, 'run.ini', "n = 5 # more\n")
+    config = io.ConfigStore([base, run], overrides={'name': 'test'})
+    assert config['n'] == 5 and config.source('n') == run
+    assert config.get('h', type=str) == '0.7'
+    assert config.get('missing', 1) == 1
+    assert config.todict() == {'h': 0.7, 'n': 5, 'name': 'test'}
+    assert config.source('name') is None
+    writefile(tmpdir, 'run.ini', "n = 6\nh = 0.67\n")
+    config.refresh()
+    assert config['n'] == 6 and config.source('h') == run
+
+
+def test_savecolumns(tmpdir):
+    fname = writefile(tmpdir, 'test.FITRES', fitres)
+    data = io.loadfile2array(fname, header='VARNAMES:', converttofloat=True,
+                             ignorecols=[0])[0]
+    dirname = str(tmpdir.join('cols'))
+    io.savecolumns(dirname, data, compression={'CID': 'gz', 'z': 'bz2'})
+    columns = io.loadcolumns(dirname, ['FITPROB', 'CID'])
+    assert list(columns.keys()) == ['FITPROB', 'CID']
+    assert isinstance(columns['FITPROB'], np.memmap)
+    assert (columns['CID'] == data['CID']).all()
+    assert (io.loadcolumns(dirname, asarray=True) == data).all()
+    with pytest.raises(KeyError):
+        io.loadcolumns(dirname, ['mu'])
+
+
+def test_writearray2file(tmpdir):
+    fname = writefile(tmpdir, 'test.FITRES', fitres)
+    data = io.loadfile2array(fname, header='VARNAMES:', converttofloat=True,
+                             datastrings=['SN:'], ignorecols=[0])[0]
+    out = str(tmpdir.join('out.FITRES.gz'))
+    io.writearray2file(out, data, datastrings='SN:', header='VARNAMES:',
+                       comments=['written back'], blockrows=2)
+    back = io.loadfile2array(out, header='VARNAMES:', converttofloat=True,
+                             datastrings=['SN:'], ignorecols=[0])[0]
+    assert (back == data).all()
+    out = str(tmpdir.join('out.csv'))
+    io.writearray2file(out, data[['CID', 'z']], datadelims=',',
+                       fmt={'z': '%.2f'})
+    with open(out, 'rb') as f:
+        assert f.read() == b'1001,0.10\n1002,0.20\nabc3,0.30\n'
+    io.writearray2file(out, data, datastrings='SN:', datadelims=',',
+                       header='VARNAMES:')
+    back = io.loadfile2array(out, header='VARNAMES:', converttofloat=True,
+                             datastrings=['SN:'], datadelims=',',
+                             ignorecols=[0])[0]
+    assert (back == data).all()
+    empty = np.array([(b'', 1)], dtype=[('name', 'S4'), ('n', 'i4')])
+    with pytest.raises(ValueError):
+        io.writearray2file(out, empty)
+
+
+def test_tailreader(tmpdir):
+    fname = writefile(tmpdir, 'log.FITRES', "# running\nVARNAMES: CID z\n")
+    tail = io.TailReader(fname, datastrings=['SN:'], header='VARNAMES:',
+                         ignorecols=[0])
+    assert tail.poll() is None
+    with open(fname, 'ab') as f:
+        f.write(b'SN: 1 0.1\nSN: 2 0.2\nSN: 3 0.')
+    chunk = tail.poll()
+    assert chunk.dtype.names == ('CID', 'z')
+    assert list(chunk['CID']) == [1, 2]
+    assert tail.poll() is None
+    with open(fname, 'ab') as f:
+        f.write(b'3\nSN: 4 0.4\n')
+    chunk = tail.poll()
+    assert list(chunk['z']) == [0.3, 0.4]
+    assert chunk['CID'].dtype == np.dtype('i8')
+    with open(fname, 'ab') as f:
+        f.write(b'SN: 5 0.5 extra\n')
+    with pytest.raises(ValueError):
+        tail.poll()
+    # a new file with other columns moved over it, longer than the offset
+    new = writefile(tmpdir, 'new.FITRES', "# running again\n"
+                    "VARNAMES: CID z FITPROB\n" +
+                    "".join("SN: %d 0.%d 0.9\n" % (i, i) for i in range(9)))
+    os.rename(new, fname)
+    chunk = tail.poll()
+    assert chunk.dtype.names == ('CID', 'z', 'FITPROB')
+    assert list(chunk['CID']) == list(range(9))
+
+
+def test_asyncloader(tmpdir):
+    asyncio = pytest.importorskip('asyncio')
+    fname = writefile(tmpdir, 'test.FITRES', fitres)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loader = io.AsyncLoader(concurrency=2)
+    try:
+        tables = loop.run_until_complete(asyncio.gather(*[
+            loader.loadfile2array(fname, datastrings=['SN:'],
+                                  converttofloat=True) for i in range(3)]))
+        assert [len(table[0]) for table in tables] == [3, 3, 3]
+        chunks = loader.iterfile2array(fname, chunksize=2,
+                                       datastrings=['SN:'], usecols=[2, 3])
+        sizes = []
+        while True:
+            try:
+                sizes.append(len(loop.run_until_complete(chunks.__anext__())))
+            except StopAsyncIteration:
+                break
+        assert sizes == [2, 1]
+    finally:
+        loader.close()
+        loop.close()
+        asyncio.set_event_loop(None)
+
+
+def test_asyncloader_concurrency(monkeypatch):
+    asyncio = pytest.importorskip('asyncio')
+    futures = pytest.importorskip('concurrent.futures')
+    lock = threading.Lock()
+    running = [0, 0]
+
+    def load(fname, **kwargs):
+        with lock:
+            running[0] += 1
+            running[1] = max(running)
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+        return fname
+
+    monkeypatch.setattr(io, 'loadfile2array', load)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loader = io.AsyncLoader(concurrency=2,
+                            executor=futures.ThreadPoolExecutor(8))
+    try:
+        names = loop.run_until_complete(asyncio.gather(*[
+            loader.loadfile2array(i) for i in range(6)]))
+        assert names == list(range(6))
+        assert running[1] == 2
+    finally:
+        loader.close()
+        loop.close()
+        asyncio.set_event_loop(None)
+
+
+def test_lazytable(tmpdir):
+    fname = writefile(tmpdir, 'test.FITRES', fitres)
+    data = io.loadfile2array(fname, header='VARNAMES:', datastrings=['SN:'],
+                             ignorecols=[0], converttofloat=True)[0]
+    table, coldict, ret = io.loadfile2array(fname, header='VARNAMES:',
+        datastrings=['SN:'], ignorecols=[0], usecoldicts=['CID'],
+        converttofloat=True, lazy=True, lazymaxbytes=48)
+    assert len(table) == 3 and table.parsed == []
+    assert table.names == list(data.dtype.names)
+    assert coldict[b'abc3'] == 2
+    assert (table['z'] == data['z']).all()
+    assert (table['IDSURVEY'] == data['IDSURVEY']).all()
+    assert table.parsed == ['z', 'IDSURVEY']
+    table['FITPROB']
+    assert table.parsed == ['IDSURVEY', 'FITPROB']
+    assert (table.toarray() == data).all()
+    with pytest.raises(KeyError):
+        table['mu']
+    # as in the eager load, no coldict unless usecols trims the columns
+    for lazy in (False, True):
+        assert io.loadfile2array(fname, datastrings=['SN:'],
+                                 usecoldicts=[1], converttofloat=True,
+                                 lazy=lazy)[1] == {}
@@ -10,3 +10,149 @@ print val
 print freq
 
 #assert((array([1, 2, 2, 1, 1]), array([1, 2, 3, 4, 5])))
+
+
+def test_frequencyofints():
+	a = np.array([7, -2, 3, 3, 10**12, 7, 3])
+	orig = a.copy()
+	for method in ('sort', None):
+		vals, freq = su.frequencyofints(a, method=method)
+		assert vals.tolist() == [-2, 3, 7, 10**12]
+		assert freq.tolist() == [1, 3, 2, 1]
+	assert (a == orig).all()
+	vals, freq = su.frequencyofints(z, memeff=False)
+	assert vals.tolist() == [1, 2, 3, 4, 5]
+	assert freq.tolist() == [1, 2, 2, 1, 1]
+	big = np.array([2**63 + 5, 2**63 + 5, 2**63 + 7], dtype=np.uint64)
+	for method in ('bincount', 'sort'):
+		vals, freq = su.frequencyofints(big, method=method)
+		assert vals.dtype == np.uint64
+		assert vals.tolist() == [2**63 + 5, 2**63 + 7]
+		assert freq.tolist() == [2, 1]
+	vals, freq = su.frequencyofints(np.array([-100, 100, 100], dtype=np.int8))
+	assert vals.tolist() == [-100, 100] and freq.tolist() == [1, 2]
+	vals, freq = su.frequencyofints(np.array([True, False, True]))
+	assert vals.tolist() == [False, True] and freq.tolist() == [1, 2]
+	# float ids, eg. loaded with makeintfloats, are counted by sorting
+	vals, freq = su.frequencyofints(np.array([1., 2., 2., 5.]))
+	assert vals.tolist() == [1., 2., 5.] and freq.tolist() == [1, 2, 1]
+	vals, freq = su.mostfrequentints(np.array([1., 2., 2., 5.]), 1)
+	assert vals.tolist() == [2.] and freq.tolist() == [2]
+	counter = su.FrequencyCounter([np.array([1.5, 2.5]), np.array([2.5])])
+	assert counter.result()[1].tolist() == [1, 2]
+	assert su.HeavyHitters(1, [np.array([3., 3., 4.])]).top(1)[0] == [3.]
+
+
+def test_frequencycounter():
+	a = np.random.RandomState(0).randint(0, 1000, 10000)
+	first = su.FrequencyCounter(np.array_split(a[:5000], 10))
+	second = su.FrequencyCounter([a[5000:]])
+	first.merge(second)
+	vals, freq = first.result()
+	expected = su.frequencyofints(a)
+	assert (vals == expected[0]).all() and (freq == expected[1]).all()
+	counter = su.FrequencyCounter([np.array([2**63 + 1, 2**63 + 2],
+		dtype=np.uint64)])
+	assert counter.result()[0].tolist() == [2**63 + 1, 2**63 + 2]
+	assert len(su.FrequencyCounter().result()[0]) == 0
+
+
+def test_findcommonsortedLists():
+	A = np.array([1, 2, 4, 4, 6, 9, 10])
+	B = np.array([0, 2, 4, 4, 8, 10, 11, 12])
+	rA, rB, rC = su.findcommonsortedLists(A, B)
+	assert rA.tolist() == [1, 6, 9]
+	assert rB.tolist() == [0, 8, 11, 12]
+	assert rC.tolist() == [2, 4, 4, 4, 4, 10]
+	for chunksize in (None, 1, 2, 100):
+		inA, inB, CA, CB = su.findcommonsortedLists(A, B, 
+			returnelements=False, chunksize=chunksize)
+		assert inA.tolist() == [0, 4, 5]
+		assert inB.tolist() == [0, 4, 6, 7]
+		assert CA.tolist() == [1, 2, 2, 3, 3, 6]
+		assert CB.tolist() == [1, 2, 3, 2, 3, 5]
+
+
+def test_parallelfindcommonsortedLists(tmpdir):
+	rs = np.random.RandomState(2)
+	A = np.sort(rs.randint(0, 500, 1000))
+	B = np.sort(rs.randint(0, 500, 800))
+	expected = su.findcommonsortedLists(A, B, returnelements=False)
+	fname = str(tmpdir.join('B.npy'))
+	np.save(fname, B)
+	for workers, chunksize in ((1, None), (3, None), (2, 50)):
+		result = su.parallelfindcommonsortedLists(A, fname,
+			workers=workers, chunksize=chunksize, returnelements=False,
+			tmpdir=str(tmpdir))
+		assert all((x == y).all() for x, y in zip(result, expected))
+	result = su.parallelfindcommonsortedLists(A, u'' + fname, workers=2,
+		returnelements=False, tmpdir=str(tmpdir))
+	assert all((x == y).all() for x, y in zip(result, expected))
+	rA, rB, rC = su.parallelfindcommonsortedLists(A, B, workers=2)
+	assert (rC == A[expected[2]]).all()
+	assert tmpdir.listdir() == [tmpdir.join('B.npy')]
+
+
+def test_sortedindex(tmpdir):
+	import pickle
+
+	values = np.random.RandomState(3).randint(0, 100, 300)
+	x = np.arange(-5, 110)
+	for index in (su.SortedIndex(values), 
+		su.SortedIndex(np.sort(values), presorted=True)):
+		assert (index.contains(x) == np.isin(x, values)).all()
+		keys = values if index.perm is not None else np.sort(values)
+		loc = index.locate(x)
+		assert (loc[~np.isin(x, values)] == -1).all()
+		found = loc >= 0
+		assert (keys[loc[found]] == x[found]).all()
+		assert (index.count_in_range(x, x + 10) == 
+			[((keys >= v) & (keys < v + 10)).sum() for v in x]).all()
+		inrange = index.range_query(20, 40)
+		assert sorted(inrange.tolist()) == np.flatnonzero(
+			(keys >= 20) & (keys < 40)).tolist()
+	dirname = str(tmpdir.join('index'))
+	su.SortedIndex(values).save(dirname)
+	loaded = su.SortedIndex.load(dirname)
+	assert isinstance(loaded.keys, np.memmap)
+	assert (loaded.locate(x) == su.SortedIndex(values).locate(x)).all()
+	unpickled = pickle.loads(pickle.dumps(loaded))
+	assert unpickled.dirname == dirname
+	assert (unpickled.range_query(0, 50) == loaded.range_query(0, 50)).all()
+	copy = pickle.loads(pickle.dumps(su.SortedIndex(values), 2))
+	assert copy.dirname is None and (copy.keys == loaded.keys).all()
+
+
+def test_mostfrequentints():
+	a = np.array([4, 9, 9, 1, 4, 9, -3, 4, 2, 2, 9])
+	vals, freq = su.mostfrequentints(a, 3)
+	assert vals.tolist() == [9, 4, 2] and freq.tolist() == [4, 3, 2]
+	vals, freq = su.mostfrequentints(a, 100)
+	assert vals.tolist() == [9, 4, 2, -3, 1]
+	counter = su.FrequencyCounter(np.array_split(a, 4))
+	assert counter.top(2)[0].tolist() == [9, 4]
+
+
+def test_heavyhitters():
+	rs = np.random.RandomState(4)
+	a = np.concatenate((rs.randint(0, 10**6, 20000), np.repeat([5, 77], 3000)))
+	rs.shuffle(a)
+	parts = [su.HeavyHitters(10, np.array_split(part, 7)) 
+		for part in np.array_split(a, 3)]
+	hitters = parts[0]
+	for part in parts[1:]:
+		hitters.merge(part)
+	assert hitters.n == len(a) and len(hitters.vals) <= 10
+	assert hitters.errorbound <= len(a) // 11
+	vals, freq = hitters.top(2)
+	assert sorted(vals.tolist()) == [5, 77]
+	exact = dict(zip(*su.frequencyofints(a)))
+	for val, count in zip(*hitters.result()):
+		assert exact[val] - hitters.errorbound <= count <= exact[val]
+	ids = np.array([2**63 + 1, 2**63 + 2, 2**63 + 2, 2**63 + 3], dtype=np.uint64)
+	hitters = su.HeavyHitters(3, [ids[:2], ids[2:]])
+	hitters.merge(su.HeavyHitters(3))
+	vals, freq = hitters.result()
+	assert vals.dtype == np.uint64
+	assert vals.tolist() == [2**63 + 1, 2**63 + 2, 2**63 + 3]
+	assert su.HeavyHitters(2).errorbound == 0
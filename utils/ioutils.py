@@ -5,8 +5,16 @@
 #HISTORY:
 #Copied loadfile2array from ioutilst in sntools without further checking.
 #R. Biswas, Sat May 10 18:57:23 CDT 2014
+import ast
+import collections
+import hashlib
+import json
+import operator
+import os
+import re
 import numpy as np
-import sys
+import tempfile
+import tokenize
 
 def tokenizeline (line, delimitter="", ignorestrings="#"):
     """
@@ -23,6 +31,7 @@ def tokenizeline (line, delimitter="", ignorestrings="#"):
         string of characters (other than whitespace) to 
         be used as a delimiter for tokenizing the line. 
         for example  in the case of a line of TSV, it would be "\t"
+        A list of such strings may be given to use several delimiters.
     ignorestrings: string, optional, defaults to "#"
         string, after which the remainder of the line will be ignored
         in the list of tokens
@@ -40,12 +49,14 @@ def tokenizeline (line, delimitter="", ignorestrings="#"):
     (['KJAHS KH AKJHS jjhJH', ' JH HJ   JHH JH'], ['tests'])
     >>> tokenizeline(myline, delimitter="") 
     (['KJAHS', 'KH', 'AKJHS', 'jjhJH.', 'JH', 'HJ', 'JHH', 'JH'], ['tests'])
+    >>> tokenizeline("a,b;c #tests", delimitter=[",", ";"])
+    (['a', 'b', 'c'], ['tests'])
 
     ..notes:
         _tokenizeline which had a slightly different call signature seemed 
         too complicated and can be done more simply. Slightly different still,
         as the metadata is captured as a list rather than a comment string.
-        TODO: allow multiple delimiter strings. 
+        For tokenizing many lines, use a Tokenizer, which is built once.
     """    
     line = line.strip()
 
@@ -54,8 +65,10 @@ def tokenizeline (line, delimitter="", ignorestrings="#"):
     commentlist = lst[1:]
     linelst = lst[0].strip()
 
-    if delimitter == '':
+    if delimitter == '' or delimitter == []:
         tokens = linelst.split()
+    elif isinstance(delimitter, (list, tuple)):
+        tokens = re.split('|'.join(map(re.escape, delimitter)), linelst)
     else:
         tokens  = linelst.split(delimitter)
 
@@ -145,19 +158,149 @@ def guessarraytype (arr, makeintfloats=False):
     >>> guessarraytype(arr)
     'a20'
 
+    ..notes:
+        Now a wrapper around guesscolumntype, which works on the whole
+        array at once, keeping the old names for the types.
     """
-    typearr = np.array(map(lambda x: guesstype(x, 
-                       makeintfloats=makeintfloats)[0], arr)) 
-    if any(typearr  == 'a20'):
-        return 'a20'
-    elif any(typearr == 'f4'):
-        return 'f4'
-    elif all(typearr == 'i8'):
+    coltype = guesscolumntype(arr, makeintfloats=makeintfloats)
+    if coltype == 'i8':
         return 'i8'
+    elif coltype == 'f8':
+        return 'f4'
+    return 'a20'
+
+
+# Types tried, in order of increasing generality, when guessing the type
+# of a column. Columns that cannot be cast to any of them are strings.
+_TYPELADDER = ('i8', 'f8')
+
+
+def _castcolumn(column, first=0):
+    """
+    cast the string array column to the first type of _TYPELADDER, starting
+    from the index first, that can represent all its elements. Each cast
+    is done on the whole array, so a failure costs one exception for the
+    column rather than one for each element.
+
+    Returns
+    -------
+    tuple: (index, converted)
+        index of the type in _TYPELADDER (len(_TYPELADDER) for strings) and
+        the converted array
+    """
+    for i in range(first, len(_TYPELADDER)):
+        try:
+            return i, column.astype(_TYPELADDER[i])
+        except (ValueError, OverflowError):
+            pass
+    if column.dtype.kind not in ('S', 'U'):
+        column = column.astype('S')
+    charsize = 4 if column.dtype.kind == 'U' else 1
+    width = np.char.str_len(column).max() if len(column) > 0 else 1
+    if width < column.dtype.itemsize // charsize:
+        column = column.astype('%s%d' % (column.dtype.kind, max(width, 1)))
+    return len(_TYPELADDER), column
+
+
+def _convertcolumn(column, makeintfloats=False, nsample=None):
+    """
+    convert the string array column to the most specific of the types
+    'i8', 'f8' or a string type with the width of its longest element
+    that can represent all of its elements, and return it. If nsample
+    is not None the type is guessed from the first nsample elements and
+    the remaining ones are only cast to that type (or a more general one,
+    if the cast fails).
+    """
+    column = np.asarray(column)
+    if nsample is None or nsample >= len(column):
+        i, converted = _castcolumn(column)
     else:
-        raise ValueError('It seems that guesstype is not finding one of \
-            \'f4\', \'i8\' or \'a20\' as the types of all elements in arr')
-        sys.exit()
+        i, converted = _castcolumn(column[:nsample])
+        j, rest = _castcolumn(column[nsample:], first=i)
+        if j != i:
+            i, converted = _castcolumn(column[:nsample], first=j)
+        converted = np.concatenate((converted, rest))
+    if makeintfloats and i == 0:
+        converted = converted.astype('f8')
+    return converted
+
+
+def guesscolumntype(column, makeintfloats=False, nsample=None):
+    """
+    guess the type of a column of strings, out of 'i8', 'f8' and strings,
+    working on the whole column at once rather than element by element.
+    The types are tried in this order, and the first one that can represent
+    all of the elements is returned.
+
+    Parameters
+    ----------
+    column: mandatory, array-like object of strings
+        column of strings, preferably a numpy string array
+    makeintfloats: optional, bool, defaults to False
+        If true, columns of integers are guessed to be 'f8'
+    nsample: optional, integer, defaults to None
+        if not None, the type is guessed from the first nsample elements
+        only, and the remaining elements are then checked against that
+        type, widening it if necessary
+
+    Returns
+    -------
+    One of 'i8', 'f8' or 'S<n>' ('U<n>' for unicode input) where n is the
+    width of the column
+
+    Examples
+    --------
+    >>> guesscolumntype(np.array(['3', '2', '4']))
+    'i8'
+    >>> guesscolumntype(['3', '2', '4'], makeintfloats=True)
+    'f8'
+    >>> guesscolumntype(['3', '2', '4', '7.0'], nsample=2)
+    'f8'
+    >>> guesscolumntype(np.array(['3.4', '2.7', '4.0', 's23']))
+    'S3'
+    """
+    converted = _convertcolumn(column, makeintfloats=makeintfloats,
+                               nsample=nsample)
+    return converted.dtype.str.lstrip('<>|=')
+
+
+def getdatatypes(cutlist, keys=None, makeintfloats=False, nsample=None):
+    """
+    guess the types of the columns of a table of strings, and return them
+    as a list suitable for use as the dtype of a numpy structured array.
+
+    Parameters
+    ----------
+    cutlist: mandatory, list of rows of strings or 2D array of strings
+        table, where all rows have the same number of elements
+    keys: optional, list of strings, defaults to None
+        names of the columns. If None, 'f0', 'f1', ... are used
+    makeintfloats: optional, bool, defaults to False
+        If true, columns of integers are guessed to be 'f8'
+    nsample: optional, integer, defaults to None
+        as in guesscolumntype
+
+    Returns
+    -------
+    list of tuples (key, type), where type is as in guesscolumntype
+
+    Examples
+    --------
+    >>> getdatatypes([['SN1', '3', '0.1'], ['SN22', '4', '0.2']],
+    ...              keys=['CID', 'IDSURVEY', 'z'])
+    [('CID', 'S4'), ('IDSURVEY', 'i8'), ('z', 'f8')]
+    """
+    table = np.asarray(cutlist)
+    if table.ndim != 2:
+        raise ValueError('cutlist should be a table of strings with the '
+                         'same number of elements in each row')
+    numcols = table.shape[1]
+    if keys is None:
+        keys = ['f%d' % i for i in range(numcols)]
+    return [(str(key), guesscolumntype(table[:, i],
+                                       makeintfloats=makeintfloats,
+                                       nsample=nsample))
+            for i, key in enumerate(keys)]
 
 
 def _tokenizeline (line, delimstrings=" ", ignorestrings=["#"]):
@@ -175,6 +318,7 @@ def _tokenizeline (line, delimstrings=" ", ignorestrings=["#"]):
         string of characters (other than whitespace) to 
         be used as a delimiter for tokenizing the line. 
         for example  in the case of a line of TSV, it would be "\t"
+        A list of such strings may be given to use several delimiters.
     ignorestrings: optional, defaults to ["#"]
         list of strings, occurances of any of which in a
         line indicates the remainder of the line is a
@@ -192,6 +336,8 @@ def _tokenizeline (line, delimstrings=" ", ignorestrings=["#"]):
     (['KJAHS KH AKJHS jjhJH', 'JH HJ   JHH JH'], '#tests')
     >>> _tokenizeline(myline, delimstrings="")
     (['KJAHS', 'KH', 'AKJHS', 'jjhJH.', 'JH', 'HJ', 'JHH', 'JH'], '#tests')
+    >>> _tokenizeline("a, b;c #tests", delimstrings=[",", ";"])
+    (['a', 'b', 'c'], '#tests')
 
     ..notes:
         status: Will not be using, trying to use tokenizeline instead
@@ -202,7 +348,8 @@ def _tokenizeline (line, delimstrings=" ", ignorestrings=["#"]):
             R. Biswas, July 17, 2012
             Rewritten to work for multiple ignorestrings in list to fix bug,
             R. Biswas, Sep 15, 2012
-        TODO: allow multiple delimiter strings. 
+        Multiple delimiter strings are allowed as a list. For tokenizing
+        many lines, use a Tokenizer, which is built once.
     """    
     tokens=[]
     comments = ''
@@ -234,19 +381,250 @@ def _tokenizeline (line, delimstrings=" ", ignorestrings=["#"]):
             tokstring = linelist[0]
         else:
             tokstring = tmp
-        if delimstrings== "":
+        if delimstrings== "" or delimstrings == []:
             tokens = tokstring.split()
+        elif isinstance(delimstrings, (list, tuple)):
+            tokens = [x.strip() for x in
+                      re.split('|'.join(map(re.escape, delimstrings)),
+                               tokstring)]
         else:
             #print "delimstring " , delimstrings
             tokens = map(lambda x: x.strip(), tokstring.split(delimstrings))
     ret = ( tokens , comments)
     return ret
 
+def _nativestrings(arr):
+    """
+    return the list of the elements of the string array arr as native
+    python strings
+    """
+    if str is bytes:
+        return arr.tolist()
+    return [s.decode('utf-8') for s in arr.tolist()]
+
+
+def _guessvalues(values, makeintfloats=False):
+    """
+    return the list of the strings of the array values converted to int,
+    float or (native) str, as guesstype would guess each of them, but
+    with the ints and floats recognized and converted for all the values
+    at once
+
+    Examples
+    --------
+    >>> _guessvalues(np.array([b'12', b'-1.5e3', b'camb', b'nan', b'1.2.3']))
+    [12, -1500.0, 'camb', nan, '1.2.3']
+    """
+    values = np.asarray(values)
+    if len(values) == 0:
+        return []
+    result = np.array(_nativestrings(values), dtype=object)
+    lengths = np.char.str_len(values)
+    unsigned = np.char.lstrip(values, b'+-')
+    isint = ((lengths - np.char.str_len(unsigned) <= 1)
+             & np.char.isdigit(unsigned) & (lengths < 19))
+    isfloat = ~isint & (lengths > 0) & (
+        (np.char.strip(values, b'0123456789.eE+-') == b'')
+        | np.isin(np.char.lower(unsigned), [b'nan', b'inf', b'infinity']))
+    if isint.any():
+        ints = values[isint].astype('i8')
+        result[isint] = ints.astype('f8') if makeintfloats else ints
+    if isfloat.any():
+        try:
+            result[isfloat] = values[isfloat].astype('f8')
+        except ValueError:
+            # eg. "1.2.3": only these few strings are tried one by one
+            for i in np.flatnonzero(isfloat):
+                try:
+                    result[i] = float(values[i])
+                except ValueError:
+                    pass
+    return result.tolist()
+
+
+class ParamFile(object):
+    """
+    reader of a parameter file of lines key = value (as read by builddict)
+    which is read and parsed once, with array operations, into the keys
+    and values of all its lines and the byte offsets of its lines. The
+    blocks between startblock and endblock markers are then found from
+    the offsets of the markers, and the dictionaries of the blocks are
+    kept, so that any number of blocks (or the whole file) can be served
+    without reading the file again. The file is parsed again if its
+    modification time changes.
+
+    Parameters
+    ----------
+    fname: mandatory, string
+        name of the parameter file
+    ignorestrings: optional, list of strings, defaults to ["#"]
+        strings after which the remaining part of a line is ignored
+    dictdelim: optional, string, defaults to '='
+        delimiter between the keys and the values
+
+    Examples
+    --------
+    >>> params = ParamFile("params.ini") # doctest: +SKIP
+    >>> params.block("# cosmology", "# end")["omega_m"] # doctest: +SKIP
+    0.3
+    """
+    def __init__(self, fname, ignorestrings=['#'], dictdelim='='):
+        self.fname = fname
+        self.ignorestrings = [_tobytes(st) for st in ignorestrings]
+        self.dictdelim = _tobytes(dictdelim)
+        self._mtime = None
+
+    def _read(self):
+        """
+        return the (modification time, size) of the file and its contents
+        """
+        st = os.stat(self.fname)
+        with open(self.fname, 'rb') as f:
+            data = f.read()
+        return (st.st_mtime, st.st_size), data
+
+    def _refresh(self):
+        """
+        parse the file if it was not parsed yet or has changed since
+        """
+        st = os.stat(self.fname)
+        if (st.st_mtime, st.st_size) != self._mtime:
+            self._parse(*self._read())
+
+    def _parse(self, mtime, data):
+        """
+        parse the contents data of the file. Only the keys, the values
+        and the line offsets are kept, not the contents.
+        """
+        buf = np.frombuffer(data, dtype=np.uint8)
+        linestarts, ends, nlines = _linebounds(buf)
+
+        # strip the lines before cutting the comments, as the line by
+        # line reader did: only the bytes in [starts, ends) are parsed
+        text = np.concatenate((np.flatnonzero(~_WHITESPACE[buf]),
+                               [len(buf)]))
+        i = np.searchsorted(text, linestarts)
+        j = np.searchsorted(text, ends) - 1
+        nonblank = j >= i
+        starts = np.where(nonblank, text[i], linestarts)
+        ends = np.where(nonblank, text[j] + 1, linestarts)
+        if len(self.ignorestrings) > 0:
+            table, longer = _bytetable(self.ignorestrings)
+            first = _firstin(_findany(buf, table, longer)[0], starts, ends)
+            ends = np.where(first >= 0, first, ends)
+
+        if self.dictdelim:
+            # lines with a delimiter have a key and a value, which is the
+            # text between the first and second delimiters
+            delims = _findall(buf, self.dictdelim)
+            first = _firstin(delims, starts, ends)
+            first[first + len(self.dictdelim) > ends] = -1
+            lines = np.flatnonzero(first >= 0)
+            keystarts, first, ends = starts[lines], first[lines], ends[lines]
+            valstarts = first + len(self.dictdelim)
+            second = _firstin(delims, valstarts, ends)
+            second[second + len(self.dictdelim) > ends] = -1
+        else:
+            # the key and the value are the first two words of the lines
+            # which have two
+            spaces = np.flatnonzero(_WHITESPACE[buf])
+            first = _firstin(spaces, starts, ends)
+            valstarts = text[np.searchsorted(text, np.maximum(first, 0))]
+            lines = np.flatnonzero((first >= 0) & (valstarts < ends))
+            keystarts, first, ends = starts[lines], first[lines], ends[lines]
+            valstarts = valstarts[lines]
+            second = _firstin(spaces, valstarts, ends)
+        valends = np.where(second >= 0, second, ends)
+
+        self._linestarts = linestarts
+        self._entrylines = lines
+        self._keys = _nativestrings(np.char.strip(
+            _gathertokens(buf, keystarts, first - keystarts)))
+        self._values = np.char.strip(
+            _gathertokens(buf, valstarts, valends - valstarts))
+        self._typedvalues = None
+        self._markers = {}
+        self._blocks = {}
+        self._mtime = mtime
+
+    def _markerlines(self, marker):
+        """
+        return the sorted indices of the lines containing marker. The
+        file is read again to search it, and parsed again if it changed.
+        """
+        if marker not in self._markers:
+            mtime, data = self._read()
+            if mtime != self._mtime:
+                self._parse(mtime, data)
+            buf = np.frombuffer(data, dtype=np.uint8)
+            pos = _findall(buf, _tobytes(marker))
+            lines = np.searchsorted(self._linestarts, pos, side='right') - 1
+            self._markers[marker] = np.unique(lines)
+        return self._markers[marker]
+
+    def blockranges(self, startblock=None, endblock=None):
+        """
+        return the list of (first, stop) indices of the entries of the
+        blocks read by builddict, each starting at a line containing
+        startblock and ending before the next line containing endblock
+        (or at the end of the file)
+        """
+        self._refresh()
+        if startblock is None:
+            return [(0, len(self._keys))]
+        startlines = self._markerlines(startblock)
+        endlines = (self._markerlines(endblock) if endblock is not None
+                    else np.zeros(0, dtype=np.intp))
+        nlines = len(self._linestarts)
+        ranges = []
+        line = 0
+        while True:
+            i = np.searchsorted(startlines, line)
+            if i == len(startlines):
+                break
+            first = startlines[i]
+            j = np.searchsorted(endlines, first, side='right')
+            stop = endlines[j] if j < len(endlines) else nlines
+            ranges.append(tuple(np.searchsorted(self._entrylines,
+                                                [first, stop])))
+            if stop == nlines:
+                break
+            line = stop
+        return ranges
+
+    def block(self, startblock=None, endblock=None, typed=True):
+        """
+        return the dictionary of keys and values of the blocks between
+        startblock and endblock (see builddict), or of the whole file if
+        startblock is None. If typed is True the values are converted to
+        int, float or str, otherwise they are strings.
+        """
+        self._refresh()
+        cachekey = (startblock, endblock, typed)
+        if cachekey not in self._blocks:
+            if typed:
+                if self._typedvalues is None:
+                    self._typedvalues = _guessvalues(self._values)
+                values = self._typedvalues
+            else:
+                values = _nativestrings(self._values)
+            paramdict = {}
+            for first, stop in self.blockranges(startblock, endblock):
+                paramdict.update(zip(self._keys[first:stop],
+                                     values[first:stop]))
+            self._blocks[cachekey] = paramdict
+        return dict(self._blocks[cachekey])
+
+
+_PARAMFILES = {}
+
+
 def builddict(fname,
     ignorestrings=['#'],
     dictdelim='=',
     startblock = None, 
-    endblock =None):
+    endblock =None,
+    typed = False):
 
     """builddict (fname) reads in the file with filename
     fname, and builds a dictionary of keys vs values from
@@ -268,6 +646,9 @@ def builddict(fname,
             Can do a replace within only the starting and ending
             blocks but both must be provided. These blocks can 
             start with a comment string 
+        typed = optional, bool, defaults to False
+            if True, the values are converted to int, float or
+            str as guesstype would
     returns:
         dictionary of keys and values (in strings)
     example usage :
@@ -278,295 +659,3286 @@ def builddict(fname,
         That was in configdict. Rewritten to use ioutilst, not tested 
         yet,
         R. Biswas, Aug 09, 2012
+        Rewritten to read the file through a ParamFile, which is
+        kept for each file, so that the file is read and parsed
+        only once (and again when it is modified) however many
+        blocks are taken from it.
     """
-    f = open(fname, "r")
-    line = f.readline()
-    i = 0
-    
-    #print ignorestrings
-    paramdict={}
-    readin = False
-    while line != '': 
-        if startblock: 
-            if (readin ==False):
-                if line.find(startblock) !=-1:
-                    readin = True
+    paramfile = _paramfile(fname, ignorestrings=ignorestrings,
+                           dictdelim=dictdelim)
+    return paramfile.block(startblock, endblock, typed=typed)
+
+
+def _paramfile(fname, ignorestrings=['#'], dictdelim='='):
+    """
+    return the ParamFile of fname kept for the process, creating it if
+    needed
+    """
+    cachekey = (os.path.abspath(fname), tuple(ignorestrings), dictdelim)
+    if cachekey not in _PARAMFILES:
+        _PARAMFILES[cachekey] = ParamFile(fname,
+                                          ignorestrings=ignorestrings,
+                                          dictdelim=dictdelim)
+    return _PARAMFILES[cachekey]
+
+
+class ConfigStore(object):
+    """
+    typed parameters merged from a list of parameter files, in which the
+    later files override the earlier ones and overrides overrides them
+    all. The files are parsed concurrently by ParamFile objects which are
+    shared with builddict, so a file is only parsed once per process
+    until it is modified. Lookups use the merged dictionary; refresh
+    parses again the files modified since.
+
+    Parameters
+    ----------
+    fnames: mandatory, list of strings
+        names of the parameter files, from the lowest to the highest
+        priority
+    overrides: optional, dictionary, defaults to None
+        values overriding those of all the files, eg. from the command line
+    ignorestrings, dictdelim, startblock, endblock: optional
+        as in builddict, for all the files
+    workers: optional, integer, defaults to 8
+        number of threads parsing the files
+
+    Examples
+    --------
+    >>> config = ConfigStore(["defaults.ini", "survey.ini", "run.ini"],
+    ...                      overrides={"nsteps": 10}) # doctest: +SKIP
+    >>> config.get("omega_m", type=float) # doctest: +SKIP
+    0.3
+    >>> config.source("omega_m") # doctest: +SKIP
+    'run.ini'
+    """
+    def __init__(self, fnames,
+                 overrides=None,
+                 ignorestrings=['#'],
+                 dictdelim='=',
+                 startblock=None,
+                 endblock=None,
+                 workers=8):
+        self.fnames = list(fnames)
+        self.overrides = dict(overrides or {})
+        self.startblock = startblock
+        self.endblock = endblock
+        self.workers = workers
+        self._paramfiles = [_paramfile(fname, ignorestrings=ignorestrings,
+                                       dictdelim=dictdelim)
+                            for fname in self.fnames]
+        self._state = None
+        self.refresh()
+
+    def refresh(self):
+        """
+        parse again the files which were modified, and merge the layers
+        again if any was
+        """
+        paramfiles = self._paramfiles
+        if self.workers > 1 and len(paramfiles) > 1:
+            import multiprocessing.pool
+
+            pool = multiprocessing.pool.ThreadPool(min(self.workers,
+                                                       len(paramfiles)))
+            try:
+                pool.map(ParamFile._refresh, paramfiles)
+            finally:
+                pool.close()
+                pool.join()
         else:
-            readin  =True
-        if readin == False:
-            line = f.readline()
-            continue    
-    #while line != '':
-        tmp = _tokenizeline(line, ignorestrings=ignorestrings,
-                            delimstrings=dictdelim)
-        
-        #print line , tmp
-        tmp = tmp[0]
-        if len(tmp) >1:
-                key = tmp[0].strip()
-                #print key, tmp
-                val = tmp[1].strip()
-                paramdict[str(key)] = str(val)  
-        line=f.readline()
-        if endblock and line.find(endblock) !=-1:
-            readin = False
-            #print "FOUND ENDBLOCK"
+            for paramfile in paramfiles:
+                paramfile._refresh()
+        state = [paramfile._mtime for paramfile in paramfiles]
+        if state == self._state:
+            return
+        self._merged = {}
+        self._sources = {}
+        for fname, paramfile in zip(self.fnames, paramfiles):
+            layer = paramfile.block(self.startblock, self.endblock)
+            self._merged.update(layer)
+            self._sources.update(dict.fromkeys(layer, fname))
+        self._merged.update(self.overrides)
+        self._sources.update(dict.fromkeys(self.overrides))
+        self._state = state
+
+    def __getitem__(self, key):
+        return self._merged[key]
+
+    def __contains__(self, key):
+        return key in self._merged
+
+    def __len__(self):
+        return len(self._merged)
+
+    def keys(self):
+        return list(self._merged.keys())
+
+    def todict(self):
+        """
+        return a copy of the merged dictionary of the parameters
+        """
+        return dict(self._merged)
+
+    def get(self, key, default=None, type=None):
+        """
+        return the value of the parameter key, or default if there is no
+        such parameter. If type is not None, the value is converted with
+        it (eg. float for a parameter which may be written as an integer).
+        """
+        if key not in self._merged:
+            return default
+        value = self._merged[key]
+        if type is not None:
+            value = type(value)
+        return value
+
+    def source(self, key):
+        """
+        return the name of the file giving the value of the parameter key,
+        or None if it is given by overrides
+        """
+        return self._sources[key]
+
+# Columnar tokenizing engine used by loadfile2array. A block of complete
+# lines is viewed as a uint8 array and split into tokens with array
+# operations, so that no per-row python list is ever created. Tokens are
+# described by their byte offsets into the block, and whole columns are
+# gathered at once into fixed width string arrays which numpy converts to
+# numbers in C.
+
+_BLOCKSIZE = 1 << 24
+_WHITESPACE = np.zeros(256, dtype=bool)
+_WHITESPACE[[ord(c) for c in ' \t\r\v\f']] = True
+
+
+def _tobytes(s):
+    """
+    return the string s as bytes (a no-op for python 2 str)
+    """
+    if isinstance(s, bytes):
+        return s
+    return s.encode('ascii')
+
+
+def _readblocks(f, blocksize=_BLOCKSIZE):
+    """
+    generator yielding the contents of the open (binary) file object f in
+    blocks of roughly blocksize bytes, each of which ends on a newline
+    (except possibly the last one)
+    """
+    rest = b''
+    while True:
+        data = f.read(blocksize)
+        if not data:
+            break
+        if rest:
+            data = rest + data
+        cut = data.rfind(b'\n') + 1
+        if cut == 0:
+            rest = data
             continue
-    
-    f.close()
-    return paramdict
-def loadfile2array(fname, 
-    datastrings = [],
-    datadelims = "",
-    ignorestrings = ["#"], 
-    ignorelines = [],
-    ignorecols = [] , 
-    usecols = [],
-    usecoldicts = [],
-    validatetable = True,
-    converttofloat =False,
-    keys = None ,
-    makeintfloats = False,
-    verbose = False,
-    extension =''):
+        rest = data[cut:]
+        yield data[:cut]
+    if rest:
+        yield rest
 
-    """loadfiletoarray loads a (part) of a ASCII file to a list or a 
-    numpy array.
-    args:
-        fname:         mandatory , string 
-            name of file which is to be read
-            eg. "FITOPT001.FITRES
-        datastrings:     optional, list of strings, defaults to []
-            if not an empty list, contains strings with which 
-            the lines containing data to be turned into a np
-            array. 
-        datadelims:    optional, string, defaults to ""
-            if equal to "" (default) the data delimiters are 
-            assumed to be whitespace. Otherwise this string
-            has to be specified (eg for a CSV)
-        ignorelines: optional, list of integers, defaults to []
-            list of file linenumbers on the file which will be 
-            ignored. These linenumbers start from 1 and match
-            the line numbers shown by vi 
-        ignorestrings:     optional, list of strings, defaults to []
-            if not an empyty list, contains strings after which
-            a line will not be read in
-        usecols:    optional, list of integers, defaults to []
-            only load these cols into the array
-        ignorecols:     optional, list of integers, defaults to []
-            do not load these cols into the array.
-        NB: It is expected that none or only one of 
-            usecols, and ignorecols will be used     
-        usecoldicts:    optional, list of integers , defaults to  []
-            col number of a set of strings that could be used 
-            to identify the row
-        validatetable: optional, defaults to True
-            if True, checks that the number of elements in mylist 
-            for each row is the same. On success it returns a return
-            code of 0, else a return code of 1
-        converttofloat:    optional, defaults to False
-            if True, then it converts the Table to a numpy 
-                array of floats
-            if False, the it leaves the table as a list of strings
-        verbose:
-            optional, bool, defaults to False
-            if True, turns on vmode, printing out messages.
-        extension:    optional, defaults to ""
-            if 'gz', uses the gzip library to open gzipped files
-    returns:
-        tuple
-            if converttofloat == True, 
-                (numpy structued 2D array , list of strings, 
-                returncode ) 
-            else , 
-                (list of list of strings , 
-                empty list of strings , returncode)
 
-            returncode = 0 , everything checked out
-                   = 1 , terrible failure
-            
-            I PLAN TO KEEP returncode AS THE LAST ENTRY
-            OF THE TUPLE, R. Biswas, July 18, 2012
-    example usage:
-        (data , dictlist , returncode) = 
-            io.loadfiletoarray("FITOPT001.FITRES",
-            datastrings=["SN"],
-            ignorecols=[0,1], 
-            converttofloat=True, 
-            usecoldicts = [0,1])
-    status:
-        tested using testio.py
-        Most features seem to work
-            R. Biswas, July 18, 2012
-        updated this routine to put in a real coldict. Have no idea
-        why I wrote the return values the way they were. Got rid of 
-        dictlist and have a col. I don't see the point of having 
-        multiple values in the dictionary
-            R. Biswas, Aug 11,2012
-        rewritten from loadfiletoarray to use a numpy structured array
-            R. Biswas,  Mon Mar 25 00:31:47 CDT 2013
-        Fixed bug that arose when a column had inconsistent types, eg.
-            starting with int but then incorporating strings (as in
-            cids) by looking at the entire column.
-            R. Biswas, Mon Mar 25 09:06:14 CDT 2013
+def _findall(buf, pattern):
+    """
+    return the sorted positions in the uint8 array buf at which the byte
+    string pattern starts
     """
-    import numpy as np
-    import gzip
+    pat = np.frombuffer(pattern, dtype=np.uint8)
+    n = len(buf) - len(pat) + 1
+    if n <= 0 or len(pat) == 0:
+        return np.zeros(0, dtype=np.intp)
+    pos = np.flatnonzero(buf[:n] == pat[0])
+    for k in range(1, len(pat)):
+        pos = pos[buf[pos + k] == pat[k]]
+    return pos
 
-    vmode = False
-    if verbose :
-        vmode = True
-    if extension=="":
-        f = open(fname,"r")
-    elif extension == "gz":
-        f = gzip.open(fname,"rb")
-    else:
-        "Don't know what this extension is"
-        return 1
-    line = f.readline()
-    linenum  = 1 
 
-    mylist = []
+def _firstin(pos, starts, ends):
+    """
+    given sorted positions pos, return for each interval [starts, ends)
+    the first position lying in it, or -1 if there is none
+    """
+    if len(pos) == 0:
+        return np.repeat(-1, len(starts))
+    i = np.searchsorted(pos, starts)
+    cand = pos[np.minimum(i, len(pos) - 1)]
+    return np.where((i < len(pos)) & (cand < ends), cand, -1)
+
 
-    numelems = 0 #Number of elements in each row of the list    
-    numtokens = 0
-    if vmode:
-        print "INPUTS "
-        print "datastrings", "usecols", "ignorecols"
-        print datastrings, usecols , ignorecols , "\n" 
-    while line!="":
-        if verbose:
-            print 'iterating line loop'
-        tokens = []
-        newtoken = False
-        currentline = line
-        line = f.readline() #CHECK
-        linenum +=1
-        if vmode:
-            print "Linenum = ", linenum
-            print "corresponding line = ", currentline +"\n"
-    
-            # Leave out lines that we don't want
-        if linenum in ignorelines:
-            if vmode:
-                print "Ignoring line ", currentline, "in ignorelines ", ignorelines
-            continue
-        if any(map(lambda x: currentline.startswith(x),ignorestrings)):
-            if vmode:
-                print "Ignoring line ", currentline, "starting with ignorestrings ", ignorestrings
-            continue
-            #If there is a datastring
-        if len(datastrings)==0:
-#orig            tokens , comments = tokenizeline (currentline, 
-            tokens , comments = tokenizeline (currentline, 
-                    ignorestrings = ignorestrings,
-                    delimstrings =  datadelims)
-            newtoken = True
-            numtokens = len(tokens)
-            if vmode:
-                print "in  line no "+ linenum + numtokens +"tokens were found" 
-        elif any(map(lambda x: currentline.startswith(x),datastrings)):
-#orig            tokens, comments = tokenizeline (currentline, 
-            tokens, comments = tokenizeline (currentline, 
-                    ignorestrings = ignorestrings, 
-                    delimstrings = datadelims)
-            if vmode:
-                print "current line ", currentline + " tokenized to ", tokens  
-            newtoken = True
-            numtokens = len(tokens)
+def _startswith(buf, starts, ends, prefixes):
+    """
+    return a bool array which is True for the lines [starts, ends) of buf
+    starting with any of the byte strings in prefixes
+    """
+    mask = np.zeros(len(starts), dtype=bool)
+    last = max(len(buf) - 1, 0)
+    for prefix in prefixes:
+        pat = np.frombuffer(prefix, dtype=np.uint8)
+        match = (ends - starts) >= len(pat)
+        for k in range(len(pat)):
+            match &= buf[np.minimum(starts + k, last)] == pat[k]
+        mask |= match
+    return mask
+
+
+def _linebounds(buf, datastrings=(), ignorelines=(), firstline=1):
+    """
+    find the lines of the uint8 array buf.
+
+    Returns
+    -------
+    tuple: (starts, ends, nlines)
+        byte offsets of the start and end (excluding the line terminator)
+        of the lines kept, ie. those starting with one of datastrings (if
+        not empty) and whose line number (starting from firstline) is not
+        in ignorelines, and the number of lines in buf
+    """
+    n = len(buf)
+    newlines = np.flatnonzero(buf == ord('\n'))
+    starts = np.concatenate(([0], newlines + 1))
+    ends = np.concatenate((newlines, [n]))
+    if starts[-1] == n:
+        starts, ends = starts[:-1], ends[:-1]
+    nlines = len(starts)
+    ends = ends - ((ends > starts) & (buf[np.maximum(ends - 1, 0)] == ord('\r')))
+
+    keep = np.ones(nlines, dtype=bool)
+    if len(ignorelines) > 0:
+        linenums = np.arange(firstline, firstline + nlines)
+        keep &= ~np.isin(linenums, ignorelines)
+    if len(datastrings) > 0:
+        keep &= _startswith(buf, starts, ends, datastrings)
+    return starts[keep], ends[keep], nlines
+
+
+def _insidelines(n, starts, ends):
+    """
+    return a bool array of length n which is True for the bytes within
+    the lines [starts, ends)
+    """
+    delta = np.zeros(n + 1, dtype=np.int8)
+    delta[starts] += 1
+    delta[ends] -= 1
+    return np.cumsum(delta[:-1], dtype=np.int8).astype(bool)
+
+
+def _bytetable(strings):
+    """
+    return a lookup table of the single byte strings in strings, and the
+    list of the longer ones
+    """
+    table = np.zeros(256, dtype=bool)
+    longer = []
+    for st in strings:
+        if len(st) == 1:
+            table[ord(st)] = True
         else:
-            pass
-        if validatetable:
-            if numelems == 0:
-                numelems = numtokens
-            if numelems != numtokens:
-                return ([], [] ,1 )    
+            longer.append(st)
+    return table, longer
 
-        if newtoken:
-            if vmode:
-                print  "new tokens found of length" , len(tokens)
-                print "These tokens are " , tokens
-            if len(tokens)>0:
-                mylist.append(tokens)
-        #line = f.readline()
-        #print line , "\n", tokens
-        if verbose:
-            print "mylist now of length ", len(mylist)
-            print "mylist = " ,mylist
 
-    f.close()
+def _findany(buf, table, longer):
+    """
+    return the sorted positions in buf of the single byte strings of the
+    lookup table table and the lengths of the strings found there, with
+    the positions of the strings in longer
+    """
+    positions = [np.flatnonzero(table[buf])]
+    lengths = [np.ones(len(positions[0]), dtype=np.intp)]
+    for st in longer:
+        positions.append(_findall(buf, st))
+        lengths.append(np.repeat(len(st), len(positions[-1])))
+    positions = np.concatenate(positions)
+    lengths = np.concatenate(lengths)
+    if len(longer) > 0:
+        order = np.argsort(positions, kind='mergesort')
+        positions, lengths = positions[order], lengths[order]
+    return positions, lengths
 
-    if vmode:
-        print "printing mylist[0]"
-        print mylist[0]
-    cutlist =[]
-    dictlist = []
-    coldict = {}
 
-        ###Choose Columns for list
-    if len(ignorecols) > 0:
-        usecols = [i for i in range(len(mylist[0])) if i not in ignorecols]
-    
-    if vmode:
-        print len(mylist[0])
-        print len(usecols)
-    cutlistiter = 0
-    if (len(usecols) < len(mylist[0])) and (len(usecols)!=0):
-        for row in mylist:
-            cutrow = [row[i] for i in range(len(row)) if i in usecols]
-            cutlist.append(cutrow)
-            #print usecoldicts
-            if len(usecoldicts) > 0:
-                dictrow = [row[i] for i in range(len(row)) if i in usecoldicts]
-                dictlist.append(dictrow)
-                coldict[dictrow[0]] = cutlistiter
-                
-            cutlistiter +=1
-    else:
-        cutlist = mylist
-    
-        
-        ### Assuming things can be turned into floats
-    if converttofloat:
-        ### Check the data types of 1st row
-        types = getdatatypes(cutlist, keys = keys,makeintfloats =makeintfloats)
-            
-        #print types
-        #print cutlist
-        #print len(cutlist)
-        cutarray = np.zeros(len(cutlist),dtype=types)
-        #print len(cutarray)
-        for i in range(len(cutlist)):
-            #map(float, cutlist[i])
-            #cutarray[i] = np.array(map(float,cutlist[i]))
-            #print len(cutlist)
-            cutarray[i] = tuple(cutlist[i])
-            #print i, len(cutlist[i]), len(cutarray[i])
-            #print cutlist[i]
-            #print cutarray[i] 
-        #print "length of array ", len(cutarray)
-        #return (cutarray ,dictlist , 0 )
-        return (cutarray ,coldict , 0 )
-        
-    #return (cutlist , dictlist , 0 )
-    return (cutlist , coldict , 0 )
+class Tokenizer(object):
+    """
+    Tokenizer of lines of ASCII tables, built once from the delimiters,
+    comment markers and data prefixes, and reused for many lines. Single
+    byte delimiters and comment markers are looked up in tables, so that a
+    whole block of lines is tokenized with a few numpy operations whatever
+    the number of delimiters, and single lines are tokenized with regular
+    expressions compiled once.
+
+    Parameters
+    ----------
+    delimiters: optional, string or list of strings, defaults to ""
+        delimiters separating the tokens (eg. [",", ";"]). If "" or
+        empty, tokens are separated by whitespace.
+    ignorestrings: optional, list of strings, defaults to ["#"]
+        comment markers: the remainder of a line after any of them is
+        not tokenized
+    datastrings: optional, list of strings, defaults to []
+        if not empty, only lines starting with one of these are rows
+        (for tokenize and tokenizeblock)
+
+    Examples
+    --------
+    >>> tokenizer = Tokenizer(delimiters=[",", ";"])
+    >>> tokenizer.tokenizeline("a, b;c # comment")
+    (['a', 'b', 'c'], '# comment')
+    >>> tokenizer.tokenize(["1,2;3", "# skip", "4;5,6"])
+    [['1', '2', '3'], ['4', '5', '6']]
+    >>> Tokenizer(datastrings=["SN:"]).tokenize("SN: 1 2\\nVAR: x\\n")
+    [['SN:', '1', '2']]
+    """
+    def __init__(self, delimiters="", ignorestrings=["#"], datastrings=[]):
+        if not isinstance(delimiters, (list, tuple)):
+            delimiters = [delimiters]
+        delimiters = [d for d in delimiters if len(d) > 0]
+        self.delimiters = [_tobytes(d) for d in delimiters]
+        self.ignorestrings = [_tobytes(st) for st in ignorestrings]
+        self.datastrings = [_tobytes(st) for st in datastrings]
+        self._delimtable, self._longdelims = _bytetable(self.delimiters)
+        self._commenttable, self._longcomments = _bytetable(
+            self.ignorestrings)
+
+        self._commentre = None
+        if len(ignorestrings) > 0:
+            self._commentre = re.compile('|'.join(re.escape(st) for st in
+                                                  ignorestrings))
+        self._splitre = None
+        if len(delimiters) > 0:
+            self._splitre = re.compile('|'.join(re.escape(d) for d in
+                                                delimiters))
+
+    def tokenizeline(self, line):
+        """
+        tokenize the string line, as _tokenizeline does.
+
+        Returns
+        -------
+        tuple: list of token strings, string of comments
+        """
+        tmp = line.strip()
+        comments = ''
+        if self._commentre is not None:
+            match = self._commentre.search(tmp)
+            if match is not None:
+                comments = tmp[match.start():]
+                tmp = tmp[:match.start()]
+        if tmp.strip() == '':
+            return [], comments
+        if self._splitre is None:
+            return tmp.split(), comments
+        return [token.strip() for token in self._splitre.split(tmp)], comments
+
+    def _rowbounds(self, data, ignorelines=(), firstline=1):
+        """
+        return (buf, starts, ends, inside, nlines) for the block data, where
+        buf is a uint8 view of data, starts and ends are the offsets of the
+        lines kept (ends excluding comments), inside the bool array which is
+        True for the bytes of these lines, and nlines the number of lines
+        """
+        buf = np.frombuffer(data, dtype=np.uint8)
+        starts, ends, nlines = _linebounds(buf, datastrings=self.datastrings,
+                                           ignorelines=ignorelines,
+                                           firstline=firstline)
+
+        # Drop comments
+        if len(self.ignorestrings) > 0:
+            markers = _findany(buf, self._commenttable,
+                               self._longcomments)[0]
+            first = _firstin(markers, starts, ends)
+            ends = np.where(first >= 0, first, ends)
+        return buf, starts, ends, _insidelines(len(buf), starts, ends), nlines
+
+    def tokenizecolumns(self, data, cols, ignorelines=(), firstline=1):
+        """
+        tokenize a block of complete lines, only extracting the columns
+        cols. For whitespace separated tables only the starts of the
+        tokens are located for all columns: the other columns are skipped
+        over and never measured, gathered or converted.
+
+        Returns
+        -------
+        tuple: (columns, counts, nlines)
+            list of string arrays of the columns cols of the rows kept
+            (empty strings for rows which are too short), the number of
+            tokens in each row kept and the number of lines in data
+        """
+        if len(self.delimiters) > 0:
+            buf, tokstarts, tokends, counts, nlines = self.tokenizeblock(
+                data, ignorelines=ignorelines, firstline=firstline)
+            return (_blockcolumns(buf, tokstarts, tokends, counts, cols),
+                    counts, nlines)
+
+        buf, starts, ends, inside, nlines = self._rowbounds(data,
+            ignorelines=ignorelines, firstline=firstline)
+        n = len(buf)
+        nonsep = inside & ~_WHITESPACE[buf]
+        tokstarts = np.flatnonzero(nonsep &
+                                   np.concatenate(([True], ~nonsep[:-1])))
+        first = np.searchsorted(tokstarts, starts)
+        counts = np.searchsorted(tokstarts, ends) - first
+        rows = counts > 0
+        first, counts = first[rows], counts[rows]
+        columns = []
+        for j in cols:
+            valid = counts > j
+            colstarts = np.zeros(len(counts), dtype=np.intp)
+            colstarts[valid] = tokstarts[first[valid] + j]
+            colends = colstarts.copy()
+            idx = np.flatnonzero(valid)
+            while len(idx) > 0:
+                colends[idx] += 1
+                idx = idx[nonsep[np.minimum(colends[idx], n - 1)] &
+                          (colends[idx] < n)]
+            columns.append(_gathertokens(buf, colstarts, colends - colstarts))
+        return columns, counts, nlines
+
+    def tokenizeblock(self, data, ignorelines=(), firstline=1):
+        """
+        tokenize a block of complete lines in one go.
+
+        Parameters
+        ----------
+        data: mandatory, bytes
+            block of lines
+        ignorelines: optional, sequence of integers, defaults to ()
+            line numbers (starting from 1) of lines to drop
+        firstline: optional, integer, defaults to 1
+            line number of the first line in data
+
+        Returns
+        -------
+        tuple: (buf, tokstarts, tokends, counts, nlines)
+            buf is a uint8 view of data, tokstarts and tokends are the byte
+            offsets of the tokens of the rows kept (in order), counts the
+            number of tokens in each row kept and nlines the number of
+            lines in data.
+        """
+        buf, starts, ends, inside, nlines = self._rowbounds(data,
+            ignorelines=ignorelines, firstline=firstline)
+        n = len(buf)
+        ws = _WHITESPACE[buf]
+
+        if len(self.delimiters) == 0:
+            sep = ws | ~inside
+            nonsep = ~sep
+            tokstarts = np.flatnonzero(nonsep &
+                                       np.concatenate(([True], sep[:-1])))
+            tokends = np.flatnonzero(nonsep &
+                                     np.concatenate((sep[1:], [True]))) + 1
+            lineidx = np.searchsorted(starts, tokstarts, side='right') - 1
+            counts = np.bincount(lineidx, minlength=len(starts))
+            return buf, tokstarts, tokends, counts[counts > 0], nlines
+
+        # Lines without any content are not rows
+        content = _firstin(np.flatnonzero(~ws), starts, ends) >= 0
+        starts, ends = starts[content], ends[content]
+        if not content.all():
+            inside = _insidelines(n, starts, ends)
+
+        dstarts, dlengths = _findany(buf, self._delimtable, self._longdelims)
+        keep = inside[dstarts] & inside[np.minimum(dstarts + dlengths - 1,
+                                                   max(n - 1, 0))]
+        dstarts, dends = dstarts[keep], dstarts[keep] + dlengths[keep]
+        counts = np.bincount(np.searchsorted(starts, dstarts,
+                                             side='right') - 1,
+                             minlength=len(starts)) + 1
+        tokstarts = np.sort(np.concatenate((starts, dends)))
+        tokends = np.sort(np.concatenate((dstarts, ends)))
+
+        # Strip whitespace around the tokens
+        last = max(n - 1, 0)
+        while True:
+            m = (tokstarts < tokends) & ws[np.minimum(tokstarts, last)]
+            if not m.any():
+                break
+            tokstarts[m] += 1
+        while True:
+            m = (tokstarts < tokends) & ws[np.maximum(tokends - 1, 0)]
+            if not m.any():
+                break
+            tokends[m] -= 1
+        return buf, tokstarts, tokends, counts, nlines
+
+    def _asblock(self, lines):
+        if isinstance(lines, (list, tuple)):
+            return b'\n'.join(_tobytes(line.rstrip('\r\n')) for line in lines)
+        return _tobytes(lines)
+
+    def tokenize(self, lines):
+        """
+        tokenize a list of lines, or a string holding many lines, in one
+        batched call, and return the list of rows (lists of tokens) found
+        """
+        buf, tokstarts, tokends, counts, nlines = self.tokenizeblock(
+            self._asblock(lines))
+        tokens = _gathertokens(buf, tokstarts, tokends - tokstarts)
+        if str is not bytes:
+            tokens = tokens.astype('U')
+        tokens = tokens.tolist()
+        rows = []
+        first = 0
+        for count in counts.tolist():
+            rows.append(tokens[first: first + count])
+            first += count
+        return rows
+
+    def columns(self, lines, cols=None):
+        """
+        tokenize a list of lines, or a string holding many lines, in one
+        batched call, and return the columns cols (all the columns of the
+        first row if None) as a list of string arrays
+        """
+        buf, tokstarts, tokends, counts, nlines = self.tokenizeblock(
+            self._asblock(lines))
+        if cols is None:
+            cols = range(counts[0] if len(counts) > 0 else 0)
+        return _blockcolumns(buf, tokstarts, tokends, counts, cols)
+
+
+def _gathertokens(buf, starts, lengths):
+    """
+    return a fixed width string array of the tokens of buf starting at
+    starts with lengths lengths
+    """
+    width = max(int(lengths.max()) if len(lengths) else 0, 1)
+    out = np.zeros((len(starts), width), dtype=np.uint8)
+    for k in range(width):
+        m = lengths > k
+        out[m, k] = buf[starts[m] + k]
+    return out.view('S%d' % width).ravel()
+
+
+def _blockcolumns(buf, tokstarts, tokends, counts, cols):
+    """
+    return a list of string arrays holding the columns cols of the rows of
+    a tokenized block. Rows with fewer tokens have empty strings in the
+    missing columns.
+    """
+    first = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.intp)
+    columns = []
+    for j in cols:
+        valid = counts > j
+        idx = np.where(valid, first + j, 0)
+        if len(tokstarts) == 0:
+            starts = np.zeros(len(counts), dtype=np.intp)
+            lengths = starts
+        else:
+            starts = np.where(valid, tokstarts[idx], 0)
+            lengths = np.where(valid, tokends[idx] - tokstarts[idx], 0)
+        columns.append(_gathertokens(buf, starts, lengths))
+    return columns
+
+
+def _gzipdecompressor():
+    import zlib
+    return zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+
+def _bz2decompressor():
+    import bz2
+    return bz2.BZ2Decompressor()
+
+
+def _xzdecompressor():
+    try:
+        import lzma
+    except ImportError:
+        from backports import lzma
+    return lzma.LZMADecompressor()
+
+
+def _gzipcompressor():
+    import zlib
+    return zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+
+def _bz2compressor():
+    import bz2
+    return bz2.BZ2Compressor()
+
+
+def _xzcompressor():
+    try:
+        import lzma
+    except ImportError:
+        from backports import lzma
+    return lzma.LZMACompressor()
+
+
+# Compressed formats: extension -> (magic bytes, decompressor factory)
+_COMPRESSIONS = {'gz': (b'\x1f\x8b', _gzipdecompressor),
+                 'bz2': (b'BZh', _bz2decompressor),
+                 'xz': (b'\xfd7zXZ\x00', _xzdecompressor)}
+_COMPRESSORS = {'gz': _gzipcompressor,
+                'bz2': _bz2compressor,
+                'xz': _xzcompressor}
+
+
+def _tempfile(fname, mode='wb'):
+    """
+    return (f, tmp): the open file object f of a new temporary file tmp
+    in the directory of fname, named after it, to be moved to fname with
+    _replacefile once written. Each call has its own file, so that
+    threads and processes writing fname at once do not collide.
+    """
+    dirname, name = os.path.split(fname)
+    fd, tmp = tempfile.mkstemp(prefix=name + '.', suffix='.tmp',
+                               dir=dirname or '.')
+    return os.fdopen(fd, mode), tmp
+
+
+def _replacefile(tmp, fname):
+    """
+    move the temporary file tmp to fname. If that fails because another
+    writer has just put fname in place, its file is kept.
+    """
+    try:
+        os.rename(tmp, fname)
+    except OSError:
+        if not os.path.exists(fname):
+            raise
+        os.remove(tmp)
+
+
+def _createfile(fname, extension=''):
+    """
+    open the file fname for writing, compressed in the format of the
+    extension 'gz', 'bz2' or 'xz' (or not if extension is '')
+
+    Raises a ValueError if the extension is not known.
+    """
+    if extension == '':
+        return open(fname, 'wb')
+    if extension not in _COMPRESSORS:
+        raise ValueError("Don't know what the extension %s is" % extension)
+    return _CompressedFile(open(fname, 'wb'), _COMPRESSORS[extension]())
+
+
+class _DecompressedFile(object):
+    """
+    file like object decompressing the open (binary) file f in a stream,
+    reading blocksize compressed bytes at a time. Concatenated streams
+    (eg. multi member gzip files) are decompressed one after the other.
+    """
+    def __init__(self, f, newdecompressor, blocksize=1 << 20):
+        self.f = f
+        self.newdecompressor = newdecompressor
+        self.decompressor = newdecompressor()
+        self.blocksize = blocksize
+        self._pending = b''
+
+    def _decompress(self):
+        """
+        return the next piece of decompressed data (of any length), or an
+        empty string at the end of the file
+        """
+        while True:
+            data = self.f.read(self.blocksize)
+            if not data:
+                return b''
+            # a stream may have ended exactly at the end of the last read
+            if getattr(self.decompressor, 'eof', False):
+                self.decompressor = self.newdecompressor()
+            try:
+                out = self.decompressor.decompress(data)
+            except EOFError:
+                # finished decompressors without eof (bz2 in python 2)
+                self.decompressor = self.newdecompressor()
+                out = self.decompressor.decompress(data)
+            while self.decompressor.unused_data:
+                rest = self.decompressor.unused_data
+                self.decompressor = self.newdecompressor()
+                out += self.decompressor.decompress(rest)
+            if out:
+                return out
+
+    def read(self, size=-1):
+        """
+        return at most size bytes of decompressed data (all the remaining
+        data if size is negative), or an empty string at the end of the
+        file. Less than size bytes may be returned before the end.
+        """
+        if size < 0:
+            pieces = [self._pending]
+            self._pending = b''
+            data = self._decompress()
+            while data:
+                pieces.append(data)
+                data = self._decompress()
+            return b''.join(pieces)
+        if not self._pending:
+            self._pending = self._decompress()
+        data, self._pending = self._pending[:size], self._pending[size:]
+        return data
+
+    def close(self):
+        self.f.close()
+
+
+class _CompressedFile(object):
+    """
+    file like object writing the data written to it compressed to the
+    open (binary) file f
+    """
+    def __init__(self, f, compressor):
+        self.f = f
+        self.compressor = compressor
+
+    def write(self, data):
+        self.f.write(self.compressor.compress(data))
+
+    def close(self):
+        self.f.write(self.compressor.flush())
+        self.f.close()
+
+
+def _detectcompression(fname):
+    """
+    return the extension ('gz', 'bz2', 'xz') of the compressed format of
+    the file fname detected from its first bytes, or '' if it is not
+    compressed
+    """
+    with open(fname, 'rb') as f:
+        magic = f.read(8)
+    for extension, (prefix, newdecompressor) in _COMPRESSIONS.items():
+        if magic.startswith(prefix):
+            return extension
+    return ''
+
+
+def _openfile(fname, extension=''):
+    """
+    open the file fname for reading bytes. If extension is '', the
+    compression (gzip, bzip2 or xz) is detected from the first bytes of the
+    file, otherwise it is given by extension ('gz', 'bz2', 'xz'). Compressed
+    files are returned as a _DecompressedFile. Returns None if the
+    extension is not known.
+    """
+    if extension == '':
+        extension = _detectcompression(fname)
+    if extension == '':
+        return open(fname, 'rb')
+    if extension not in _COMPRESSIONS:
+        return None
+    return _DecompressedFile(open(fname, 'rb'), _COMPRESSIONS[extension][1])
+
+
+def _prefetch(iterable, depth=2):
+    """
+    generator yielding the items of iterable, which are produced up to
+    depth items ahead in a background thread. This lets, for example, the
+    decompression of the next block of a file (which releases the GIL)
+    overlap with the parsing of the current one.
+    """
+    import threading
+    try:
+        import queue
+    except ImportError:
+        import Queue as queue
+
+    items = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((None, item)):
+                    return
+            put((None, done))
+        except Exception as error:
+            put((error, None))
+
+    thread = threading.Thread(target=produce)
+    thread.daemon = True
+    thread.start()
+    try:
+        while True:
+            error, item = items.get()
+            if error is not None:
+                raise error
+            if item is done:
+                break
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+_WHEREOPS = {'Lt': operator.lt, 'LtE': operator.le,
+             'Gt': operator.gt, 'GtE': operator.ge,
+             'Eq': operator.eq, 'NotEq': operator.ne,
+             'Add': operator.add, 'Sub': operator.sub,
+             'Mult': operator.mul, 'Div': operator.truediv,
+             'Mod': operator.mod, 'Pow': operator.pow,
+             'USub': operator.neg, 'UAdd': operator.pos,
+             'Not': np.logical_not,
+             'And': np.logical_and, 'Or': np.logical_or}
+_WHEREFUNCS = ('abs', 'sqrt', 'log', 'log10', 'exp', 'isnan', 'isfinite')
+_WHERENODES = ('Expression', 'Compare', 'BoolOp', 'BinOp', 'UnaryOp',
+               'Call', 'Name', 'Load', 'Num', 'Str', 'Bytes', 'Constant',
+               'NameConstant') + tuple(_WHEREOPS)
+
+
+def _parsewhere(where):
+    """
+    parse the row filter where, an expression on column names such as
+    "z < 0.5 & FITPROB > 0.01", and return the tuple (tree, names) of its
+    syntax tree and the names of the columns it uses. As in numpy, &, |
+    and ~ are the logical operators, but they bind less tightly than the
+    comparisons, so that no parentheses are needed. Comparisons, the
+    arithmetic operators, numbers, strings and the functions of
+    _WHEREFUNCS are allowed.
+
+    Raises a SyntaxError if where is not such an expression.
+    """
+    import functools
+
+    logical = {'&': 'and', '|': 'or', '~': 'not'}
+    readline = functools.partial(next, iter([where]), '')
+    tokens = [logical.get(token[1], token[1])
+              for token in tokenize.generate_tokens(readline)]
+    tree = ast.parse(' '.join(tokens).strip(), mode='eval')
+    names = set()
+    for node in ast.walk(tree):
+        kind = type(node).__name__
+        if kind not in _WHERENODES:
+            raise SyntaxError("%s is not allowed in where=%r" % (kind, where))
+        if kind == 'Call' and (type(node.func).__name__ != 'Name'
+                               or node.func.id not in _WHEREFUNCS
+                               or len(node.args) != 1
+                               or len(node.keywords) > 0):
+            raise SyntaxError("only the calls %s with one argument are "
+                              "allowed in where=%r" % (_WHEREFUNCS, where))
+        if kind == 'Name' and node.id not in _WHEREFUNCS + ('True', 'False'):
+            names.add(node.id)
+    return tree, names
+
+
+def _isstringnode(node):
+    """
+    return True if the syntax tree node is a string literal
+    """
+    kind = type(node).__name__
+    if kind in ('Str', 'Bytes'):
+        return True
+    return kind == 'Constant' and isinstance(node.value,
+                                             (bytes, type(u'')))
+
+
+def _evalwhere(node, column, raw=False):
+    """
+    evaluate the syntax tree node of _parsewhere, where column(name, raw)
+    returns the typed array of the column name, or its string array if
+    raw is True. The columns compared with string literals are raw.
+    """
+    kind = type(node).__name__
+    if kind == 'Expression':
+        return _evalwhere(node.body, column)
+    if kind == 'Name':
+        if node.id in ('True', 'False'):
+            return node.id == 'True'
+        return column(node.id, raw)
+    if kind in ('Num', 'Str', 'Bytes', 'Constant', 'NameConstant'):
+        for field in ('value', 'n', 's'):
+            if hasattr(node, field):
+                value = getattr(node, field)
+                break
+        if isinstance(value, type(u'')):
+            value = _tobytes(value)
+        return value
+    if kind == 'Compare':
+        raw = any(_isstringnode(operand)
+                  for operand in [node.left] + node.comparators)
+        left = _evalwhere(node.left, column, raw)
+        result = True
+        for op, comparator in zip(node.ops, node.comparators):
+            right = _evalwhere(comparator, column, raw)
+            result = np.logical_and(result,
+                                    _WHEREOPS[type(op).__name__](left, right))
+            left = right
+        return result
+    if kind == 'BoolOp':
+        values = [_evalwhere(value, column) for value in node.values]
+        return _WHEREOPS[type(node.op).__name__].reduce(values)
+    if kind == 'BinOp':
+        return _WHEREOPS[type(node.op).__name__](
+            _evalwhere(node.left, column), _evalwhere(node.right, column))
+    if kind == 'UnaryOp':
+        return _WHEREOPS[type(node.op).__name__](
+            _evalwhere(node.operand, column))
+    return getattr(np, node.func.id)(_evalwhere(node.args[0], column))
+
+
+def _wheremask(where, columns, keys=None, dtype=None):
+    """
+    return the boolean array of the rows of the string arrays columns,
+    named by keys (or 'f0', 'f1', ...), which pass the row filter where
+    = (tree, names) of _parsewhere. Only the columns used by the filter
+    are converted: to the types of the fields of dtype if it is given
+    (and the columns are then named by its fields), otherwise to the
+    types guessed for them by _convertcolumn, except when they are
+    compared to strings, as the guess may differ from block to block.
+
+    Raises a KeyError if the filter uses a column which is not loaded.
+    """
+    tree, names = where
+    if dtype is not None and dtype.names is not None:
+        keys = dtype.names
+    if keys is None:
+        keys = ['f%d' % i for i in range(len(columns))]
+    index = dict((str(key), i) for i, key in enumerate(keys))
+    for name in names:
+        if name not in index:
+            raise KeyError("where uses the column %s, which is not one of "
+                           "the columns loaded %s" % (name, list(keys)))
+    typed = {}
+
+    def column(name, raw=False):
+        col = columns[index[name]]
+        if dtype is not None and dtype.names is not None:
+            if name not in typed:
+                try:
+                    typed[name] = col.astype(dtype[name])
+                except ValueError:
+                    raise ValueError("column %s cannot be converted to %s"
+                                     % (name, dtype[name]))
+            return typed[name]
+        if raw:
+            return col
+        if name not in typed:
+            typed[name] = _convertcolumn(col)
+        return typed[name]
+
+    numrows = len(columns[0]) if len(columns) > 0 else 0
+    mask = np.broadcast_to(_evalwhere(tree, column), (numrows,))
+    return np.asarray(mask, dtype=bool)
+
+
+class _RaggedRowsError(ValueError):
+    """
+    raised by _iterblockcolumns when the rows do not validate
+    """
+
+
+def _iterblockcolumns(f,
+    datastrings=[],
+    datadelims="",
+    ignorestrings=["#"],
+    ignorelines=[],
+    ignorecols=[],
+    usecols=[],
+    usecoldicts=[],
+    validatetable=True,
+    verbose=False,
+    blocksize=_BLOCKSIZE,
+    firstline=1,
+    numcols=None,
+    where=None,
+    keys=None,
+    dtype=None):
+    """
+    generator reading the open file f block by block and yielding for each
+    block with rows a tuple (columns, dictcolumn), where columns is a list
+    of string arrays of the selected columns and dictcolumn the string
+    array of the first column in usecoldicts (None unless usecols trims
+    the columns, as for the coldict of loadfile2array). The arguments are
+    those of loadfile2array, and in addition firstline is the line number
+    of the first line of f and numcols the number of tokens in a row, if
+    it is known (otherwise taken from the first row of f). If where is
+    not None, only the rows of each block passing it are yielded, the
+    columns it uses being converted to the types of dtype if given.
+
+    Raises a ValueError if validatetable is True and the rows do not all
+    have the same number of tokens.
+    """
+    tokenizer = Tokenizer(delimiters=datadelims,
+                          ignorestrings=ignorestrings,
+                          datastrings=datastrings)
+    if where is not None:
+        where = _parsewhere(where)
+
+    numelems = numcols
+    cols = None
+    dictcols = []
+    if numcols is not None:
+        cols, dictcols = _selectcols(numcols, usecols, ignorecols,
+                                     usecoldicts)
+    linenum = firstline
+    blocks = _readblocks(f, blocksize)
+    if isinstance(f, _DecompressedFile):
+        blocks = _prefetch(blocks)
+    for data in blocks:
+        if cols is None:
+            # the first row gives the columns, so that all the blocks
+            # are pruned to them as they are tokenized
+            numtokens = _firstcount(tokenizer, data, ignorelines=ignorelines,
+                                    firstline=linenum)
+            if numtokens is None:
+                linenum += data.count(b'\n') + (not data.endswith(b'\n'))
+                continue
+            cols, dictcols = _selectcols(numtokens, usecols, ignorecols,
+                                         usecoldicts)
+        columns, counts, nlines = tokenizer.tokenizecolumns(data,
+            cols + dictcols, ignorelines=ignorelines, firstline=linenum)
+        linenum += nlines
+        if len(counts) == 0:
+            continue
+        if validatetable:
+            if numelems is None:
+                numelems = counts[0]
+            if (counts != numelems).any():
+                raise _RaggedRowsError("rows with different numbers of tokens "
+                                 "before line %d" % linenum)
+        numkept = len(counts)
+        if where is not None:
+            mask = _wheremask(where, columns[:len(cols)], keys=keys,
+                              dtype=dtype)
+            columns = [column[mask] for column in columns]
+            numkept = int(mask.sum())
+        if verbose:
+            print("lines read %d, rows found %d, rows kept %d"
+                  % (linenum - 1, len(counts), numkept))
+        if len(dictcols) > 0:
+            yield columns[:-1], columns[-1]
+        else:
+            yield columns, None
+
+
+def _firstcount(tokenizer, data, ignorelines=(), firstline=1):
+    """
+    return the number of tokens in the first row of the block of lines
+    data (whose first line is line firstline), or None if it has no rows.
+    Only the lines up to the first row are tokenized, in prefixes of data
+    growing geometrically.
+    """
+    size = 1 << 16
+    while True:
+        cut = data.find(b'\n', min(size, len(data))) + 1
+        if cut == 0:
+            cut = len(data)
+        counts = tokenizer.tokenizeblock(data[:cut], ignorelines=ignorelines,
+                                         firstline=firstline)[3]
+        if len(counts) > 0:
+            return int(counts[0])
+        if cut == len(data):
+            return None
+        size *= 4
+
+
+def _selectcols(ncols, usecols=[], ignorecols=[], usecoldicts=[]):
+    """
+    return the sorted lists (cols, dictcols) of the indices of the columns
+    to load and of the column used for the coldict (empty unless usecols
+    trims the columns) for rows of ncols tokens, as in loadfile2array
+    """
+    for col in list(usecols) + list(ignorecols) + list(usecoldicts):
+        if not isinstance(col, (int, np.integer)):
+            raise TypeError("column %r can only be selected by name if "
+                            "the header is given" % (col,))
+    ###Choose Columns for list
+    if len(ignorecols) > 0:
+        usecols = [i for i in range(ncols) if i not in ignorecols]
+    if len(usecols) == 0:
+        cols = list(range(ncols))
+    else:
+        cols = sorted(set(usecols))
+    dictcols = []
+    if (len(usecols) < ncols) and (len(usecols) != 0):
+        dictcols = sorted(set(usecoldicts))[:1]
+    return cols, dictcols
+
+
+def _readheader(fname, header, extension='', datadelims="",
+                ignorestrings=["#"]):
+    """
+    return the tokens of the first line of the file fname starting with
+    the string header, and its line number
+    """
+    prefix = _tobytes(header)
+    tokenizer = Tokenizer(delimiters=datadelims, ignorestrings=ignorestrings)
+    f = _openfile(fname, extension)
+    if f is None:
+        raise ValueError("Don't know what the extension %s is" % extension)
+    linenum = 1
+    try:
+        for data in _readblocks(f, 1 << 16):
+            lines = data.split(b'\n')
+            if data.endswith(b'\n'):
+                lines = lines[:-1]
+            for line in lines:
+                if line.startswith(prefix):
+                    if str is not bytes:
+                        line = line.decode('ascii')
+                    return tokenizer.tokenizeline(line)[0], linenum
+                linenum += 1
+    finally:
+        f.close()
+    raise ValueError("no line of %s starts with %s" % (fname, header))
+
+
+def _applyheader(fname, header, extension='', datadelims="",
+                 ignorestrings=["#"], ignorelines=[], usecols=[],
+                 ignorecols=[], usecoldicts=[], keys=None):
+    """
+    read the names of the columns from the header line of fname (the first
+    line starting with header, whose tokens match those of the rows), and
+    return (ignorelines, usecols, usecoldicts, keys) where the header line
+    is added to ignorelines, columns given by name in usecols, ignorecols
+    or usecoldicts are replaced by their indices (ignorecols being folded
+    into usecols) and keys, if None, are the names of the columns loaded
+    """
+    names, linenum = _readheader(fname, header, extension=extension,
+                                 datadelims=datadelims,
+                                 ignorestrings=ignorestrings)
+
+    def index(col):
+        if isinstance(col, (int, np.integer)):
+            return col
+        if col not in names:
+            raise KeyError("no column %s in the header of %s"
+                           % (col, fname))
+        return names.index(col)
+
+    usecols = [index(col) for col in usecols]
+    ignorecols = [index(col) for col in ignorecols]
+    usecoldicts = [index(col) for col in usecoldicts]
+    cols = _selectcols(len(names), usecols, ignorecols)[0]
+    if len(usecols) > 0 or len(ignorecols) > 0:
+        usecols = cols
+    if keys is None:
+        keys = [names[i] for i in cols]
+    return list(ignorelines) + [linenum], usecols, usecoldicts, keys
+
+
+class _RangeFile(object):
+    """
+    file like object reading the bytes [start, stop) of the file fname
+    """
+    def __init__(self, fname, start, stop):
+        self.f = open(fname, 'rb')
+        self.f.seek(start)
+        self.remaining = stop - start
+
+    def read(self, size):
+        data = self.f.read(min(size, self.remaining))
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.f.close()
+
+
+def _splitfile(fname, nparts):
+    """
+    split the file fname into at most nparts byte ranges of similar size,
+    each ending just after a newline (or at the end of the file), and
+    return them as a list of tuples (start, stop)
+    """
+    size = os.path.getsize(fname)
+    bounds = [0]
+    with open(fname, 'rb') as f:
+        for i in range(1, nparts):
+            pos = max(size * i // nparts, bounds[-1])
+            f.seek(pos)
+            while True:
+                data = f.read(1 << 16)
+                if not data:
+                    pos = size
+                    break
+                k = data.find(b'\n')
+                if k >= 0:
+                    pos += k + 1
+                    break
+                pos += len(data)
+            bounds.append(pos)
+    bounds.append(size)
+    return [(start, stop) for start, stop in zip(bounds[:-1], bounds[1:])
+            if stop > start]
+
+
+def _countlines(task):
+    """
+    count the newlines in the byte range task = (fname, start, stop)
+    """
+    fname, start, stop = task
+    f = _RangeFile(fname, start, stop)
+    numlines = 0
+    try:
+        data = f.read(_BLOCKSIZE)
+        while data:
+            numlines += data.count(b'\n')
+            data = f.read(_BLOCKSIZE)
+    finally:
+        f.close()
+    return numlines
+
+
+def _parserange(task):
+    """
+    worker of _parallelblockcolumns returning the list of blocks yielded
+    by _iterblockcolumns for the byte range of the task, or None if the
+    rows do not validate
+    """
+    fname, start, stop, firstline, numcols, parseargs = task
+    f = _RangeFile(fname, start, stop)
+    try:
+        return list(_iterblockcolumns(f, firstline=firstline,
+                                      numcols=numcols, **parseargs))
+    except _RaggedRowsError:
+        return None
+    finally:
+        f.close()
+
+
+def _firstrowcount(fname, datastrings=[], datadelims="",
+                   ignorestrings=["#"], ignorelines=[], **kwargs):
+    """
+    return the number of tokens in the first row of the file fname, or
+    None if there are no rows
+    """
+    tokenizer = Tokenizer(delimiters=datadelims,
+                          ignorestrings=ignorestrings,
+                          datastrings=datastrings)
+    linenum = 1
+    with open(fname, 'rb') as f:
+        for data in _readblocks(f, 1 << 20):
+            buf, tokstarts, tokends, counts, nlines = tokenizer.tokenizeblock(
+                data, ignorelines=ignorelines, firstline=linenum)
+            linenum += nlines
+            if len(counts) > 0:
+                return int(counts[0])
+    return None
+
+
+def _parallelblockcolumns(fname, workers, **parseargs):
+    """
+    parse the uncompressed file fname in a pool of workers processes, and
+    return the list of blocks that _iterblockcolumns would yield for it,
+    in the order of the file, or None if the rows do not validate. The
+    number of tokens in a row is taken from the first row of the file, so
+    that all the ranges select the same columns, and the line numbers
+    of the ranges are counted first if there are ignorelines.
+    """
+    import multiprocessing
+
+    numcols = _firstrowcount(fname, **parseargs)
+    if numcols is None:
+        return []
+    ranges = _splitfile(fname, workers)
+    pool = multiprocessing.Pool(min(workers, len(ranges)))
+    try:
+        firstlines = [1] * len(ranges)
+        if len(parseargs.get('ignorelines', [])) > 0:
+            numlines = pool.map(_countlines,
+                                [(fname, start, stop)
+                                 for start, stop in ranges])
+            firstlines = 1 + np.concatenate(([0], np.cumsum(numlines)[:-1]))
+            firstlines = firstlines.tolist()
+        results = pool.map(_parserange,
+                           [(fname, start, stop, firstline, numcols, parseargs)
+                            for (start, stop), firstline in zip(ranges,
+                                                                firstlines)])
+    finally:
+        pool.close()
+        pool.join()
+    if any(result is None for result in results):
+        return None
+    return [block for result in results for block in result]
+
+
+def _columns2array(columns, keys=None, dtype=None, makeintfloats=False):
+    """
+    build a numpy structured array from a list of string arrays. If dtype
+    is None the type of each column is guessed with _convertcolumn and the
+    fields are named by keys (or 'f0', 'f1', ...), otherwise the columns
+    are converted to the types of the fields of dtype.
+    """
+    if dtype is None:
+        columns = [_convertcolumn(col, makeintfloats=makeintfloats)
+                   for col in columns]
+        if keys is None:
+            keys = ['f%d' % i for i in range(len(columns))]
+        dtype = [(str(key), col.dtype) for key, col in zip(keys, columns)]
+    dtype = np.dtype(dtype)
+    numrows = len(columns[0]) if len(columns) > 0 else 0
+    arr = np.zeros(numrows, dtype=dtype)
+    _castinto(arr, columns)
+    return arr
+
+
+def _castinto(arr, columns, start=0):
+    """
+    convert the string arrays columns to the types of the fields of the
+    numpy structured array arr, and store them in its rows from start on.
+
+    Raises a ValueError if the number of columns does not match the
+    fields, or if a column cannot be converted or has longer strings.
+    """
+    dtype = arr.dtype
+    if len(dtype.names or ()) != len(columns):
+        raise ValueError("dtype has %d fields but %d columns were loaded"
+                         % (len(dtype.names or ()), len(columns)))
+    for name, col in zip(dtype.names or (), columns):
+        fieldtype = dtype[name]
+        if (fieldtype.kind == col.dtype.kind == 'S'
+                and col.dtype.itemsize > fieldtype.itemsize
+                and np.char.str_len(col).max() > fieldtype.itemsize):
+            raise ValueError("column %s has strings longer than %s"
+                             % (name, fieldtype))
+        try:
+            arr[name][start: start + len(col)] = col.astype(fieldtype)
+        except ValueError:
+            raise ValueError("column %s cannot be converted to %s"
+                             % (name, fieldtype))
+
+
+def _blocks2array(blocks, dtype, numrows=0):
+    """
+    convert the blocks yielded by _iterblockcolumns (or a list of them)
+    straight into a numpy structured array of dtype, without guessing
+    types or keeping the string columns of more than one block. The array
+    is allocated for numrows rows, or for the number of rows of the first
+    block times numrows if numrows is negative, and doubled when it is
+    too small. Return the tuple (array, dictcolumns) where dictcolumns is
+    the list of the dictcolumn of the blocks.
+    """
+    arr = np.zeros(max(numrows, 0), dtype=dtype)
+    dictcolumns = []
+    start = 0
+    for columns, dictcolumn in blocks:
+        numblock = len(columns[0]) if len(columns) > 0 else 0
+        if numrows < 0:
+            arr = np.zeros(-numrows * numblock, dtype=dtype)
+            numrows = len(arr)
+        if start + numblock > len(arr):
+            grown = np.zeros(max(start + numblock, 2 * len(arr)),
+                             dtype=dtype)
+            grown[:start] = arr[:start]
+            arr = grown
+        _castinto(arr, columns, start)
+        start += numblock
+        if dictcolumn is not None:
+            dictcolumns.append(dictcolumn)
+    if start < len(arr):
+        arr = arr[:start].copy()
+    return arr, dictcolumns
+
+
+def saveschema(fname, dtype):
+    """
+    save the numpy structured dtype (or the dtype of the structured array)
+    dtype to the JSON file fname, to be passed later with loadschema as the
+    dtype of loadfile2array, iterfile2array or loadfiles2array.
+
+    Examples
+    --------
+    >>> data = loadfile2array("FITOPT001.FITRES", datastrings=["SN:"],
+    ...     converttofloat=True)[0] # doctest: +SKIP
+    >>> saveschema("FITRES.schema", data) # doctest: +SKIP
+    >>> data = loadfile2array("FITOPT002.FITRES", datastrings=["SN:"],
+    ...     converttofloat=True, dtype=loadschema("FITRES.schema"))[0]
+    ... # doctest: +SKIP
+    """
+    dtype = np.dtype(getattr(dtype, 'dtype', dtype))
+    with open(fname, 'w') as f:
+        json.dump(dtype.descr, f)
+
+
+def loadschema(fname):
+    """
+    return the numpy structured dtype saved to the JSON file fname by
+    saveschema
+    """
+    with open(fname) as f:
+        descr = json.load(f)
+    return np.dtype([(str(name), str(fieldtype))
+                     for name, fieldtype in descr])
+
+
+def loadfile2array(fname, 
+    datastrings = [],
+    datadelims = "",
+    ignorestrings = ["#"], 
+    ignorelines = [],
+    ignorecols = [] , 
+    usecols = [],
+    usecoldicts = [],
+    validatetable = True,
+    converttofloat =False,
+    keys = None ,
+    makeintfloats = False,
+    verbose = False,
+    extension ='',
+    cache = None,
+    workers = 1,
+    header = None,
+    where = None,
+    dtype = None,
+    lazy = False,
+    lazymaxbytes = None):
+
+    """loadfiletoarray loads a (part) of a ASCII file to a list or a 
+    numpy array.
+    args:
+        fname:         mandatory , string 
+            name of file which is to be read
+            eg. "FITOPT001.FITRES
+        datastrings:     optional, list of strings, defaults to []
+            if not an empty list, contains strings with which 
+            the lines containing data to be turned into a np
+            array. 
+        datadelims:    optional, string, defaults to ""
+            if equal to "" (default) the data delimiters are 
+            assumed to be whitespace. Otherwise this string
+            has to be specified (eg for a CSV). A list of
+            strings may be given for several delimiters.
+        ignorelines: optional, list of integers, defaults to []
+            list of file linenumbers on the file which will be 
+            ignored. These linenumbers start from 1 and match
+            the line numbers shown by vi 
+        ignorestrings:     optional, list of strings, defaults to []
+            if not an empyty list, contains strings after which
+            a line will not be read in
+        usecols:    optional, list of integers, defaults to []
+            only load these cols into the array. If header is
+            given, columns may also be given by name.
+        ignorecols:     optional, list of integers, defaults to []
+            do not load these cols into the array. If header is
+            given, columns may also be given by name.
+        NB: It is expected that none or only one of 
+            usecols, and ignorecols will be used     
+        Columns which are not loaded are skipped over by the
+            tokenizer, and never gathered or converted.
+        usecoldicts:    optional, list of integers , defaults to  []
+            col number of a set of strings that could be used 
+            to identify the row. For many lookups, or keys made
+            of several columns, build a ColumnIndex instead.
+        validatetable: optional, defaults to True
+            if True, checks that the number of elements in mylist 
+            for each row is the same. On success it returns a return
+            code of 0, else a return code of 1
+        converttofloat:    optional, defaults to False
+            if True, then it converts the Table to a numpy 
+                array of floats
+            if False, the it leaves the table as a list of strings
+            Each column is given the most specific of the types
+            'i8', 'f8' or a string type as wide as its longest
+            entry that holds all of its entries (see guesscolumntype).
+        keys: optional, list of strings, defaults to None
+            names of the fields of the structured array. If None,
+            the numpy defaults 'f0', 'f1', ... are used
+        makeintfloats: optional, bool, defaults to False
+            if True, columns of integers are converted to 'f8'
+        verbose:
+            optional, bool, defaults to False
+            if True, turns on vmode, printing out messages.
+        extension:    optional, defaults to ""
+            if 'gz', 'bz2' or 'xz', the file is decompressed with
+            the gzip, bzip2 or xz (lzma) format. If "", compressed
+            files are recognized from their first bytes. The
+            decompression runs in a background thread, ahead of
+            the parsing.
+        cache: optional, TableCache instance, defaults to None
+            if not None and converttofloat is True, the parsed
+            array and coldict are saved to (and later memory mapped
+            from) a binary sidecar in the cache, so that the file is
+            only parsed again when it or the arguments change
+        workers: optional, integer, defaults to 1
+            if larger than 1 and the file is not compressed, the
+            file is split into this many ranges of lines which are
+            parsed in a pool of processes
+        header: optional, string, defaults to None
+            if not None, the first line starting with this string
+            (eg. "VARNAMES:") holds the names of the columns, whose
+            tokens match those of the rows. The names may then be
+            used in usecols, ignorecols and usecoldicts, and are
+            used as keys if keys is None. The header line is not
+            read as a row.
+        where: optional, string, defaults to None
+            if not None, an expression on the names of the columns
+            loaded (keys, or 'f0', 'f1', ...) such as
+            "z < 0.5 & FITPROB > 0.01" selecting the rows to keep.
+            &, | and ~ bind less tightly than the comparisons.
+            It is evaluated on each block as it is read, so the
+            rows rejected are never gathered into the table.
+        dtype: optional, numpy dtype or list of (name, type),
+            defaults to None
+            if not None and converttofloat is True, the schema of
+            the array, with one field per column loaded, eg. the
+            dtype of an earlier load or one read with loadschema.
+            The types are then not guessed (keys and makeintfloats
+            are ignored), and each block is converted as it is read
+            into an array preallocated from the size of the file.
+        lazy: optional, bool, defaults to False
+            if True and converttofloat is True, return a LazyTable
+            instead of the array: the file is only indexed, and each
+            column is parsed when it is first accessed. workers and
+            cache are not used, and where cannot be given.
+        lazymaxbytes: optional, integer, defaults to None
+            memory budget of the columns kept by the LazyTable, which
+            drops the least recently used ones beyond it
+    returns:
+        tuple
+            if converttofloat == True, 
+                (numpy structued 2D array , list of strings, 
+                returncode ) 
+            else , 
+                (list of list of strings , 
+                empty list of strings , returncode)
+
+            returncode = 0 , everything checked out
+                   = 1 , terrible failure
+            
+            I PLAN TO KEEP returncode AS THE LAST ENTRY
+            OF THE TUPLE, R. Biswas, July 18, 2012
+    example usage:
+        (data , dictlist , returncode) = 
+            io.loadfiletoarray("FITOPT001.FITRES",
+            datastrings=["SN"],
+            ignorecols=[0,1], 
+            converttofloat=True, 
+            usecoldicts = [0,1])
+    status:
+        tested using testio.py
+        Most features seem to work
+            R. Biswas, July 18, 2012
+        updated this routine to put in a real coldict. Have no idea
+        why I wrote the return values the way they were. Got rid of 
+        dictlist and have a col. I don't see the point of having 
+        multiple values in the dictionary
+            R. Biswas, Aug 11,2012
+        rewritten from loadfiletoarray to use a numpy structured array
+            R. Biswas,  Mon Mar 25 00:31:47 CDT 2013
+        Fixed bug that arose when a column had inconsistent types, eg.
+            starting with int but then incorporating strings (as in
+            cids) by looking at the entire column.
+            R. Biswas, Mon Mar 25 09:06:14 CDT 2013
+        Rewritten to tokenize blocks of the file into columns with
+            numpy array operations, rather than building a list of
+            tokens for every line. Rows with a different number of
+            tokens (when validatetable is False) have empty strings in
+            the missing columns. ignorelines now counts from 1 as
+            documented.
+    """
+    vmode = False
+    if verbose :
+        vmode = True
+    if header is not None:
+        ignorelines, usecols, usecoldicts, keys = _applyheader(fname, header,
+            extension=extension,
+            datadelims=datadelims,
+            ignorestrings=ignorestrings,
+            ignorelines=ignorelines,
+            usecols=usecols,
+            ignorecols=ignorecols,
+            usecoldicts=usecoldicts,
+            keys=keys)
+        ignorecols = []
+    parseargs = dict(datastrings=datastrings,
+                     datadelims=datadelims,
+                     ignorestrings=ignorestrings,
+                     ignorelines=ignorelines,
+                     ignorecols=ignorecols,
+                     usecols=usecols,
+                     usecoldicts=usecoldicts,
+                     validatetable=validatetable,
+                     where=where,
+                     keys=keys)
+    if dtype is not None:
+        dtype = np.dtype(getattr(dtype, 'dtype', dtype))
+    parseargs['dtype'] = dtype
+    if lazy and converttofloat:
+        if where is not None:
+            raise ValueError("where cannot be used with lazy")
+        table = LazyTable(fname,
+                          datastrings=datastrings,
+                          datadelims=datadelims,
+                          ignorestrings=ignorestrings,
+                          ignorelines=ignorelines,
+                          ignorecols=ignorecols,
+                          usecols=usecols,
+                          validatetable=validatetable,
+                          keys=keys,
+                          makeintfloats=makeintfloats,
+                          dtype=dtype,
+                          extension=extension,
+                          maxbytes=lazymaxbytes)
+        coldict = {}
+        # as for the eager load, only if usecols trims the columns
+        dictcols = _selectcols(table.numcols, usecols, ignorecols,
+                               usecoldicts)[1]
+        if len(dictcols) > 0:
+            dictcolumn = table.strings(dictcols)[0]
+            coldict = dict(zip(dictcolumn.tolist(), range(len(dictcolumn))))
+        return (table, coldict, 0)
+    if cache is not None and converttofloat:
+        cachekey = cache.key(fname,
+                             makeintfloats=makeintfloats,
+                             extension=extension,
+                             **parseargs)
+        cached = cache.load(cachekey)
+        if cached is not None:
+            if vmode:
+                print("loaded %s from the cache" % fname)
+            return cached + (0,)
+    if vmode:
+        print("INPUTS datastrings %s usecols %s ignorecols %s"
+              % (datastrings, usecols, ignorecols))
+
+    f = None
+    if workers > 1 and extension == '' and _detectcompression(fname) == '':
+        blocks = _parallelblockcolumns(fname, workers, **parseargs)
+        if blocks is None:
+            return ([], [], 1)
+        numrows = sum(len(block[0][0]) for block in blocks if block[0])
+    else:
+        f = _openfile(fname, extension)
+        if f is None:
+            "Don't know what this extension is"
+            return 1
+        blocks = _iterblockcolumns(f, verbose=vmode, **parseargs)
+        # as many rows as in the first block for every block of the file
+        numrows = -(os.path.getsize(fname) // _BLOCKSIZE + 1)
+
+    columns = []
+    coldict = {}
+    try:
+        if converttofloat and dtype is not None:
+            cutarray, dictcolumns = _blocks2array(blocks, dtype, numrows)
+        else:
+            blocks = list(blocks)
+            dictcolumns = [block[1] for block in blocks
+                           if block[1] is not None]
+            if len(blocks) > 0:
+                columns = [np.concatenate([block[0][i] for block in blocks])
+                           for i in range(len(blocks[0][0]))]
+    except _RaggedRowsError:
+        return ([], [], 1)
+    finally:
+        if f is not None:
+            f.close()
+    if len(dictcolumns) > 0:
+        dictcolumn = np.concatenate(dictcolumns)
+        coldict = dict(zip(dictcolumn.tolist(), range(len(dictcolumn))))
+
+        ### Assuming things can be turned into floats
+    if converttofloat:
+        if dtype is None:
+            cutarray = _columns2array(columns, keys=keys,
+                                      makeintfloats=makeintfloats)
+        if cache is not None:
+            cache.save(cachekey, cutarray, coldict)
+        return (cutarray, coldict, 0)
+
+    if len(columns) == 0:
+        return ([], coldict, 0)
+    table = np.column_stack(columns)
+    if str is not bytes:
+        table = table.astype('U')
+    return (table.tolist() , coldict , 0 )
+
+
+def iterfile2array(fname,
+    chunksize = 100000,
+    datastrings = [],
+    datadelims = "",
+    ignorestrings = ["#"],
+    ignorelines = [],
+    ignorecols = [],
+    usecols = [],
+    validatetable = True,
+    keys = None,
+    makeintfloats = False,
+    dtype = None,
+    extension = '',
+    header = None,
+    where = None):
+    """
+    generator version of loadfile2array(converttofloat=True), yielding
+    the table in the ASCII file fname as a sequence of numpy structured
+    arrays of chunksize rows (the last one may be shorter), so that files
+    larger than the memory can be processed. All the chunks have the
+    same dtype, so they can be concatenated or fed to reductions directly.
+
+    Parameters
+    ----------
+    fname: mandatory, string
+        name of file which is to be read
+    chunksize: optional, integer, defaults to 100000
+        number of rows in each array yielded
+    datastrings, datadelims, ignorestrings, ignorelines, ignorecols,
+    usecols, validatetable, keys, makeintfloats, extension, header,
+    where: optional
+        as in loadfile2array. The chunks hold chunksize of the rows
+        passing where, which are the only ones kept in memory.
+    dtype: optional, numpy dtype or list of (name, type), defaults to None
+        dtype of the arrays yielded, with one field per column loaded.
+        If None, the types are guessed from the first chunk as in
+        loadfile2array, and keys are used as names.
+
+    Returns
+    -------
+    generator of numpy structured arrays
+
+    Raises
+    ------
+    ValueError
+        if the extension is not known, if validatetable is True and rows
+        have different numbers of tokens, or if a column of a later chunk
+        cannot be converted to the type fixed from the first chunk (or
+        has longer strings). Pass dtype to avoid this.
+
+    Examples
+    --------
+    >>> total = 0.
+    >>> chunks = iterfile2array("FITOPT001.FITRES", chunksize=10000,
+    ...         datastrings=["SN:"], usecols=[2, 5], keys=["z", "mu"],
+    ...         where="z < 0.5")
+    >>> for chunk in chunks: # doctest: +SKIP
+    ...     total += chunk["mu"].sum()
+    """
+    if header is not None:
+        ignorelines, usecols, usecoldicts, keys = _applyheader(fname, header,
+            extension=extension,
+            datadelims=datadelims,
+            ignorestrings=ignorestrings,
+            ignorelines=ignorelines,
+            usecols=usecols,
+            ignorecols=ignorecols,
+            keys=keys)
+        ignorecols = []
+    f = _openfile(fname, extension)
+    if f is None:
+        raise ValueError("Don't know what the extension %s is" % extension)
+    if dtype is not None:
+        dtype = np.dtype(dtype)
+
+    pending = []
+    numpending = 0
+    try:
+        for columns, dictcolumn in _iterblockcolumns(f,
+                datastrings=datastrings,
+                datadelims=datadelims,
+                ignorestrings=ignorestrings,
+                ignorelines=ignorelines,
+                ignorecols=ignorecols,
+                usecols=usecols,
+                validatetable=validatetable,
+                where=where,
+                keys=keys,
+                dtype=dtype):
+            pending.append(columns)
+            numpending += len(columns[0])
+            if numpending < chunksize:
+                continue
+            columns = [np.concatenate([block[i] for block in pending])
+                       for i in range(len(columns))]
+            numchunks = numpending // chunksize
+            for k in range(numchunks):
+                chunk = [col[k * chunksize: (k + 1) * chunksize]
+                         for col in columns]
+                arr = _columns2array(chunk, keys=keys, dtype=dtype,
+                                     makeintfloats=makeintfloats)
+                dtype = arr.dtype
+                yield arr
+            pending = [[col[numchunks * chunksize:] for col in columns]]
+            numpending -= numchunks * chunksize
+    finally:
+        f.close()
+    if numpending > 0:
+        columns = [np.concatenate([block[i] for block in pending])
+                   for i in range(len(pending[0]))]
+        yield _columns2array(columns, keys=keys, dtype=dtype,
+                             makeintfloats=makeintfloats)
+
+def _parsefile(task):
+    """
+    worker of loadfiles2array returning the string columns of the file of
+    task = (fname, extension, header, parseargs), None if it has no rows,
+    or raising a ValueError naming the file if its rows do not validate
+    """
+    fname, extension, header, parseargs = task
+    if header is not None:
+        parseargs = dict(parseargs)
+        parseargs['ignorelines'], parseargs['usecols'] = _applyheader(fname,
+            header,
+            extension=extension,
+            datadelims=parseargs['datadelims'],
+            ignorestrings=parseargs['ignorestrings'],
+            ignorelines=parseargs['ignorelines'],
+            usecols=parseargs['usecols'],
+            ignorecols=parseargs['ignorecols'])[:2]
+        parseargs['ignorecols'] = []
+    f = _openfile(fname, extension)
+    if f is None:
+        raise ValueError("Don't know what the extension %s is" % extension)
+    try:
+        blocks = [block[0] for block in _iterblockcolumns(f, **parseargs)]
+    except _RaggedRowsError:
+        raise ValueError("rows with different numbers of tokens in %s"
+                         % fname)
+    finally:
+        f.close()
+    if len(blocks) == 0:
+        return None
+    return [np.concatenate([block[i] for block in blocks])
+            for i in range(len(blocks[0]))]
+
+
+def loadfiles2array(fnames,
+    datastrings = [],
+    datadelims = "",
+    ignorestrings = ["#"],
+    ignorelines = [],
+    ignorecols = [],
+    usecols = [],
+    validatetable = True,
+    keys = None,
+    makeintfloats = False,
+    dtype = None,
+    extension = '',
+    sourcecol = None,
+    workers = 1,
+    threads = False,
+    header = None,
+    where = None):
+    """
+    load the tables in many ASCII files with the same layout into a single
+    numpy structured array, parsing the files concurrently. The files are
+    tokenized in the workers and the types of the columns are guessed
+    once, on the merged columns, so that all the files share one dtype
+    and the cost of guessing is not paid for every file.
+
+    Parameters
+    ----------
+    fnames: mandatory, list of strings
+        names of the files, whose rows are concatenated in this order
+    datastrings, datadelims, ignorestrings, ignorelines, ignorecols,
+    usecols, validatetable, keys, makeintfloats, extension, header,
+    where: optional
+        as in loadfile2array, applied to each file. With a header, the
+        columns are selected by name in each file, and keys default to
+        the names in the first file.
+    dtype: optional, numpy dtype or list of (name, type), defaults to None
+        as in iterfile2array
+    sourcecol: optional, string, defaults to None
+        if not None, name of an extra 'i4' field holding for each row the
+        index in fnames of the file it comes from
+    workers: optional, integer, defaults to 1
+        number of processes (or threads) parsing the files
+    threads: optional, bool, defaults to False
+        if True, use a pool of threads rather than of processes, which
+        avoids sending the parsed columns between processes
+
+    Returns
+    -------
+    numpy structured array
+
+    Raises
+    ------
+    ValueError
+        if the extension is not known, if the rows of a file do not
+        validate, or if the files do not have the same number of columns
+
+    Examples
+    --------
+    >>> import glob
+    >>> data = loadfiles2array(sorted(glob.glob("night_*.FITRES")),
+    ...     datastrings=["SN:"], ignorecols=[0], sourcecol="night",
+    ...     workers=8) # doctest: +SKIP
+    """
+    parseargs = dict(datastrings=datastrings,
+                     datadelims=datadelims,
+                     ignorestrings=ignorestrings,
+                     ignorelines=ignorelines,
+                     ignorecols=ignorecols,
+                     usecols=usecols,
+                     validatetable=validatetable)
+    if header is not None and keys is None and len(fnames) > 0:
+        keys = _applyheader(fnames[0], header,
+                            extension=extension,
+                            datadelims=datadelims,
+                            ignorestrings=ignorestrings,
+                            usecols=usecols,
+                            ignorecols=ignorecols)[3]
+    if dtype is not None:
+        dtype = np.dtype(getattr(dtype, 'dtype', dtype))
+    parseargs.update(where=where, keys=keys, dtype=dtype)
+    tasks = [(fname, extension, header, parseargs) for fname in fnames]
+    if workers > 1 and len(tasks) > 1:
+        import multiprocessing
+        import multiprocessing.pool
+
+        if threads:
+            pool = multiprocessing.pool.ThreadPool(workers)
+        else:
+            pool = multiprocessing.Pool(workers)
+        try:
+            results = pool.map(_parsefile, tasks,
+                               chunksize=max(1, len(tasks) // (4 * workers)))
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [_parsefile(task) for task in tasks]
+
+    sources = [i for i, result in enumerate(results) if result is not None]
+    results = [results[i] for i in sources]
+    numcols = set(len(result) for result in results)
+    if len(numcols) > 1:
+        raise ValueError("the files do not have the same number of columns")
+    numcols = numcols.pop() if len(numcols) > 0 else 0
+    columns = [np.concatenate([result[i] for result in results])
+               for i in range(numcols)]
+    if len(results) == 0 and dtype is not None:
+        # no rows to check the number of columns against the fields
+        arr = np.zeros(0, dtype=dtype)
+    else:
+        arr = _columns2array(columns, keys=keys, dtype=dtype,
+                             makeintfloats=makeintfloats)
+    if sourcecol is None:
+        return arr
+
+    source = np.repeat(np.array(sources, dtype='i4'),
+                       [len(result[0]) for result in results])
+    withsource = np.zeros(len(arr), dtype=arr.dtype.descr +
+                          [(str(sourcecol), 'i4')])
+    for name in arr.dtype.names or ():
+        withsource[name] = arr[name]
+    withsource[sourcecol] = source
+    return withsource
+
+
+class TailReader(object):
+    """
+    reader of the rows appended to an ASCII file which keeps growing (eg.
+    the output of a running simulation). It remembers the byte offset up
+    to which the file was read and the dtype of the rows, so that each
+    poll only parses the complete lines appended since the previous one,
+    and returns them as a numpy structured array with the same dtype as
+    the first rows. A line which is still being written is left for the
+    next poll.
+
+    Parameters
+    ----------
+    fname: mandatory, string
+        name of the (uncompressed) file
+    datastrings, datadelims, ignorestrings, ignorelines, ignorecols,
+    usecols, validatetable, keys, makeintfloats, header, where: optional
+        as in loadfile2array. validatetable checks the new rows against
+        the number of tokens of the first row of the file. With a header,
+        nothing is read until the header line is complete.
+    dtype: optional, numpy dtype or list of (name, type), defaults to None
+        dtype of the rows, guessed from the rows of the first poll
+        returning any if None
+
+    Examples
+    --------
+    >>> tail = TailReader("run/LOG.FITRES", datastrings=["SN:"],
+    ...                   header="VARNAMES:") # doctest: +SKIP
+    >>> for chunk in tail.follow(interval=10.): # doctest: +SKIP
+    ...     print(len(chunk))
+    """
+    def __init__(self, fname,
+                 datastrings=[],
+                 datadelims="",
+                 ignorestrings=["#"],
+                 ignorelines=[],
+                 ignorecols=[],
+                 usecols=[],
+                 validatetable=True,
+                 keys=None,
+                 makeintfloats=False,
+                 dtype=None,
+                 header=None,
+                 where=None):
+        self.fname = fname
+        self.parseargs = dict(datastrings=datastrings,
+                              datadelims=datadelims,
+                              ignorestrings=ignorestrings,
+                              ignorelines=ignorelines,
+                              ignorecols=ignorecols,
+                              usecols=usecols,
+                              validatetable=validatetable,
+                              where=where)
+        self.keys = keys
+        self.makeintfloats = makeintfloats
+        self.dtype = None if dtype is None else np.dtype(dtype)
+        self.header = header
+        # the state given, restored when the file is replaced
+        self._initial = (dict(self.parseargs), keys, self.dtype, header)
+        self._reset()
+        self._fileid = None
+
+    def _reset(self):
+        """
+        start reading the file again from the start, as it was given
+        """
+        parseargs, self.keys, self.dtype, self.header = self._initial
+        self.parseargs = dict(parseargs)
+        self.offset = 0
+        self.linenum = 1
+        self.numcols = None
+
+    def _lastnewline(self, size):
+        """
+        return the offset just after the last newline between self.offset
+        and size, or self.offset if there is none
+        """
+        with open(self.fname, 'rb') as f:
+            end = size
+            while end > self.offset:
+                start = max(self.offset, end - (1 << 16))
+                f.seek(start)
+                i = f.read(end - start).rfind(b'\n')
+                if i >= 0:
+                    return start + i + 1
+                end = start
+        return self.offset
+
+    def _applyheader(self, numlines):
+        """
+        select the columns with the header line if it is in the first
+        numlines lines, and return whether it is
+        """
+        parseargs = self.parseargs
+        try:
+            ignorelines, usecols, usecoldicts, keys = _applyheader(
+                self.fname, self.header,
+                datadelims=parseargs['datadelims'],
+                ignorestrings=parseargs['ignorestrings'],
+                ignorelines=parseargs['ignorelines'],
+                usecols=parseargs['usecols'],
+                ignorecols=parseargs['ignorecols'],
+                keys=self.keys)
+        except ValueError:
+            return False
+        if ignorelines[-1] > numlines:
+            return False
+        parseargs.update(ignorelines=ignorelines, usecols=usecols,
+                         ignorecols=[])
+        self.keys = keys
+        self.header = None
+        return True
+
+    def poll(self):
+        """
+        return the numpy structured array of the rows in the complete
+        lines appended since the last poll, or None if there are none.
+        If the file became shorter (it was truncated) or is another file
+        (it was replaced), it is read again from the start, its number of
+        columns, header and guessed dtype being found again.
+
+        Raises a ValueError if validatetable is True and the new rows do
+        not have the number of tokens of the first row, or if they cannot
+        be converted to the dtype. The offset is not moved then.
+        """
+        st = os.stat(self.fname)
+        size = st.st_size
+        fileid = (st.st_dev, st.st_ino)
+        if size < self.offset or (self._fileid is not None
+                                  and fileid != self._fileid):
+            self._reset()
+        self._fileid = fileid
+        stop = self._lastnewline(size)
+        if stop == self.offset:
+            return None
+        numlines = _countlines((self.fname, self.offset, stop))
+        if self.header is not None and not self._applyheader(
+                self.linenum - 1 + numlines):
+            return None
+
+        f = _RangeFile(self.fname, self.offset, stop)
+        try:
+            blocks = [block[0] for block in _iterblockcolumns(f,
+                firstline=self.linenum,
+                numcols=self.numcols,
+                keys=self.keys,
+                **self.parseargs)]
+        except _RaggedRowsError:
+            raise ValueError("rows with different numbers of tokens in "
+                             "lines %d to %d of %s" % (self.linenum,
+                             self.linenum + numlines - 1, self.fname))
+        finally:
+            f.close()
+        if self.numcols is None and len(blocks) > 0:
+            # the first row of the file has just been read
+            self.numcols = _firstrowcount(self.fname, **self.parseargs)
+        arr = None
+        numrows = sum(len(block[0]) for block in blocks if block)
+        if numrows > 0:
+            columns = [np.concatenate([block[i] for block in blocks])
+                       for i in range(len(blocks[0]))]
+            arr = _columns2array(columns, keys=self.keys, dtype=self.dtype,
+                                 makeintfloats=self.makeintfloats)
+            self.dtype = arr.dtype
+        self.offset = stop
+        self.linenum += numlines
+        return arr
+
+    def follow(self, interval=1.):
+        """
+        generator polling the file every interval seconds forever, and
+        yielding the arrays of new rows
+        """
+        import time
+
+        while True:
+            arr = self.poll()
+            if arr is None:
+                time.sleep(interval)
+            else:
+                yield arr
+
+
+class LazyTable(object):
+    """
+    table of an ASCII file whose columns are only parsed when they are
+    first accessed, as returned by loadfile2array(lazy=True). A first pass
+    over the file only counts the rows and finds the number of tokens of
+    the first row. Accessing a column then tokenizes the file
+    for that column only (as usecols would), converts it and keeps it, so
+    that a job looking at two columns of a wide table only pays for these
+    two. If maxbytes is not None, the least recently used columns are
+    dropped (to be parsed again if needed) to keep the parsed columns
+    below maxbytes.
+
+    Parameters
+    ----------
+    fname: mandatory, string
+        name of the file
+    datastrings, datadelims, ignorestrings, ignorelines, ignorecols,
+    usecols, validatetable, keys, makeintfloats, extension: optional
+        as in loadfile2array. Rows are only validated when columns are
+        parsed.
+    dtype: optional, numpy dtype or list of (name, type), defaults to None
+        types (and names) of the columns, guessed for each column when it
+        is parsed if None
+    maxbytes: optional, integer, defaults to None
+        memory budget of the parsed columns in bytes
+
+    Examples
+    --------
+    >>> table = loadfile2array("FITOPT001.FITRES", datastrings=["SN:"],
+    ...     header="VARNAMES:", converttofloat=True,
+    ...     lazy=True)[0] # doctest: +SKIP
+    >>> (table["z"] < 0.5).sum() # doctest: +SKIP
+    """
+    def __init__(self, fname,
+                 datastrings=[],
+                 datadelims="",
+                 ignorestrings=["#"],
+                 ignorelines=[],
+                 ignorecols=[],
+                 usecols=[],
+                 validatetable=True,
+                 keys=None,
+                 makeintfloats=False,
+                 dtype=None,
+                 extension='',
+                 maxbytes=None,
+                 blocksize=_BLOCKSIZE):
+        self.fname = fname
+        self.extension = extension
+        self.tokenizer = Tokenizer(delimiters=datadelims,
+                                   ignorestrings=ignorestrings,
+                                   datastrings=datastrings)
+        self.ignorelines = ignorelines
+        self.validatetable = validatetable
+        self.makeintfloats = makeintfloats
+        self.dtype = None if dtype is None else np.dtype(dtype)
+        self.maxbytes = maxbytes
+        self.blocksize = blocksize
+        self._columns = collections.OrderedDict()
+        self._index(usecols, ignorecols, keys)
+
+    def _blocks(self):
+        """
+        generator yielding (data, firstline) for the blocks of the file
+        """
+        f = _openfile(self.fname, self.extension)
+        if f is None:
+            raise ValueError("Don't know what the extension %s is"
+                             % self.extension)
+        try:
+            linenum = 1
+            for data in _readblocks(f, self.blocksize):
+                yield data, linenum
+                linenum += data.count(b'\n')
+        finally:
+            f.close()
+
+    def _index(self, usecols, ignorecols, keys):
+        """
+        count the rows and find the number of tokens of the first row,
+        and name the columns selected
+        """
+        st = os.stat(self.fname)
+        self._stamp = (st.st_mtime, st.st_size)
+        numrows = 0
+        numcols = None
+        tokenizer = self.tokenizer
+        for data, firstline in self._blocks():
+            buf = np.frombuffer(data, dtype=np.uint8)
+            starts, ends, nlines = _linebounds(buf,
+                datastrings=tokenizer.datastrings,
+                ignorelines=self.ignorelines, firstline=firstline)
+            if len(tokenizer.ignorestrings) > 0:
+                first = _firstin(_findany(buf, tokenizer._commenttable,
+                                          tokenizer._longcomments)[0],
+                                 starts, ends)
+                ends = np.where(first >= 0, first, ends)
+
+            # Rows are the lines with some content: skip leading spaces
+            pos = starts.copy()
+            idx = np.flatnonzero(pos < ends)
+            while len(idx) > 0:
+                idx = idx[_WHITESPACE[buf[pos[idx]]]]
+                pos[idx] += 1
+                idx = idx[pos[idx] < ends[idx]]
+            rows = pos < ends
+            if numcols is None and rows.any():
+                first = np.flatnonzero(rows)[0]
+                numcols = int(self.tokenizer.tokenizeblock(
+                    data[starts[first]:ends[first]])[3][0])
+            numrows += int(rows.sum())
+        self.numrows = numrows
+        self.numcols = numcols or 0
+        self._cols = _selectcols(self.numcols, usecols, ignorecols)[0]
+        if self.dtype is not None:
+            names = self.dtype.names
+        elif keys is not None:
+            names = keys
+        else:
+            names = ['f%d' % i for i in range(len(self._cols))]
+        if len(names) != len(self._cols):
+            raise ValueError("%d names for the %d columns of %s"
+                             % (len(names), len(self._cols), self.fname))
+        self._names = [str(name) for name in names]
+
+    def strings(self, cols):
+        """
+        return the columns cols of the file (counted in the rows, as for
+        usecols) as string arrays, tokenizing the file once for all of
+        them
+
+        Raises a ValueError if the file changed since it was indexed, or
+        if validatetable is True and the rows do not all have the number
+        of tokens of the first row.
+        """
+        st = os.stat(self.fname)
+        if (st.st_mtime, st.st_size) != self._stamp:
+            raise ValueError("%s changed since it was indexed" % self.fname)
+        pieces = [[] for col in cols]
+        for data, firstline in self._blocks():
+            columns, counts, nlines = self.tokenizer.tokenizecolumns(data,
+                cols, ignorelines=self.ignorelines, firstline=firstline)
+            if self.validatetable and (counts != self.numcols).any():
+                raise ValueError("rows with different numbers of tokens "
+                                 "after line %d of %s"
+                                 % (firstline, self.fname))
+            for piece, column in zip(pieces, columns):
+                piece.append(column)
+        return [np.concatenate(piece) if len(piece) > 0
+                else np.zeros(0, dtype='S1') for piece in pieces]
+
+    @property
+    def names(self):
+        """
+        names of the columns of the table
+        """
+        return list(self._names)
+
+    @property
+    def parsed(self):
+        """
+        names of the columns parsed and kept, from the least recently used
+        """
+        return list(self._columns.keys())
+
+    def __len__(self):
+        return self.numrows
+
+    def __contains__(self, name):
+        return name in self._names
+
+    def _parse(self, names):
+        """
+        parse the columns names which are not kept yet, in one pass over
+        the file, and mark names as the most recently used columns
+        """
+        for name in names:
+            if name not in self._names:
+                raise KeyError("no column %s in %s" % (name, self.fname))
+        missing = [name for name in names if name not in self._columns]
+        if len(missing) > 0:
+            strings = self.strings([self._cols[self._names.index(name)]
+                                    for name in missing])
+            for name, column in zip(missing, strings):
+                if self.dtype is None:
+                    column = _convertcolumn(column,
+                                            makeintfloats=self.makeintfloats)
+                else:
+                    arr = np.zeros(len(column),
+                                   dtype=[(name, self.dtype[name])])
+                    _castinto(arr, [column])
+                    column = arr[name]
+                self._columns[name] = column
+        for name in names:
+            self._columns[name] = self._columns.pop(name)
+        if self.maxbytes is not None:
+            total = sum(column.nbytes for column in self._columns.values())
+            for name in list(self._columns.keys()):
+                if total <= self.maxbytes:
+                    break
+                if name not in names:
+                    total -= self._columns.pop(name).nbytes
+
+    def __getitem__(self, name):
+        """
+        return the array of the column name, or a structured array of the
+        columns if name is a list of names
+        """
+        if isinstance(name, (list, tuple)):
+            return self.toarray(name)
+        self._parse([name])
+        return self._columns[name]
+
+    def toarray(self, names=None):
+        """
+        return a numpy structured array of the columns names (all of them
+        if None)
+        """
+        if names is None:
+            names = self._names
+        self._parse(names)
+        arr = np.zeros(len(self), dtype=[(name, self._columns[name].dtype)
+                                         for name in names])
+        for name in names:
+            arr[name] = self._columns[name]
+        return arr
+
+
+def _formatints(column):
+    """
+    return the decimal representations of the integer array column as a
+    2D uint8 array of their bytes, right aligned and padded with zeros,
+    computed digit by digit for the whole column at once
+    """
+    column = column.astype(np.int64)
+    negative = column < 0
+    # the cast makes abs(-2**63) right too
+    magnitude = np.abs(column).astype(np.uint64)
+    width = len(str(int(magnitude.max()))) if len(column) > 0 else 1
+    out = np.zeros((len(column), width + 1), dtype=np.uint8)
+    numdigits = np.ones(len(column), dtype=np.intp)
+    ten = np.uint64(10)
+    for k in range(width):
+        nonzero = magnitude > 0
+        digits = (magnitude % ten).astype(np.uint8) + ord('0')
+        out[:, width - k] = np.where(nonzero | (k == 0), digits, 0)
+        numdigits[nonzero] = k + 1
+        magnitude //= ten
+    rows = np.flatnonzero(negative)
+    out[rows, width - numdigits[rows]] = ord('-')
+    return out
+
+
+def _formatcolumn(column, fmt=None):
+    """
+    return the elements of the 1D array column formatted as a 2D uint8
+    array of their bytes, padded with zeros, with the printf style format
+    fmt or, if fmt is None, with the shortest representations numpy
+    gives (which read back to the same values).
+
+    Raises a ValueError if the column is not 1D or if an element is
+    formatted as an empty string, which could not be read back.
+    """
+    if column.ndim != 1:
+        raise ValueError("only 1D columns can be written, not %s"
+                         % (column.dtype,))
+    if fmt is not None:
+        column = np.char.mod(fmt, column)
+    elif column.dtype.kind == 'i' or (column.dtype.kind == 'u'
+                                      and column.dtype.itemsize < 8):
+        return _formatints(column)
+    if column.dtype.kind != 'S':
+        column = column.astype('S')
+    out = np.ascontiguousarray(column).view(np.uint8).reshape(
+        len(column), column.dtype.itemsize)
+    if len(column) > 0 and (out.shape[1] == 0 or (out[:, 0] == 0).any()):
+        raise ValueError("empty strings cannot be written as fields")
+    return out
+
+
+def _joinrows(pieces, numrows):
+    """
+    return the bytes of numrows rows made of the pieces in order, each of
+    which is either a byte string repeated on every row or a 2D uint8
+    array of the bytes of each row padded with zeros. The pieces are
+    laid side by side and the padding is squeezed out in one operation.
+    """
+    pieces = [np.broadcast_to(np.frombuffer(piece, dtype=np.uint8),
+                              (numrows, len(piece)))
+              if isinstance(piece, bytes) else piece
+              for piece in pieces]
+    rows = np.concatenate(pieces, axis=1)
+    return rows[rows != 0].tobytes()
+
+
+def writearray2file(fname,
+    arr,
+    datastrings = "",
+    datadelims = "",
+    header = None,
+    comments = [],
+    fmt = None,
+    extension = '',
+    blockrows = 100000):
+    """
+    write the numpy structured array arr to the ASCII file fname, in the
+    format read by loadfile2array: a row per line, with the fields
+    separated by a delimiter. Whole columns are formatted at once and
+    the rows of blockrows rows are assembled with array operations and
+    written as a single block.
+
+    Parameters
+    ----------
+    fname: mandatory, string
+        name of the file written
+    arr: mandatory, numpy structured array
+        table to write. String fields should not contain the delimiter
+        and should not be empty.
+    datastrings: optional, string, defaults to ""
+        string starting every row (eg. "SN:"), as the datastrings of
+        loadfile2array. If a list is given, its first string is used.
+    datadelims: optional, string, defaults to ""
+        delimiter between the fields, a space if "" as for
+        loadfile2array. If a list is given, its first string is used.
+    header: optional, string, defaults to None
+        if not None, a line starting with this string (eg. "VARNAMES:")
+        followed by the names of the fields is written before the rows,
+        to be read by the header of loadfile2array
+    comments: optional, list of strings, defaults to []
+        lines written at the top of the file, each after "# "
+    fmt: optional, string or dictionary, defaults to None
+        printf style format (eg. "%.5f") of all the fields, or a
+        dictionary of the formats of some of the fields by name. The
+        other fields are written with the shortest representation which
+        reads back to the same value.
+    extension: optional, string, defaults to ''
+        if 'gz', 'bz2' or 'xz', the file is compressed in this format.
+        If '', it is taken from the end of fname (eg. ".gz"), if that
+        is one of these.
+    blockrows: optional, integer, defaults to 100000
+        number of rows formatted and written at a time
+
+    Raises
+    ------
+    ValueError
+        if the extension is not known, a field is not 1D or a string
+        field is empty
+
+    Examples
+    --------
+    >>> writearray2file("FITOPT001.FITRES.gz", data, datastrings="SN:",
+    ...     header="VARNAMES:", fmt={"z": "%.5f"}) # doctest: +SKIP
+    >>> data, coldict, ret = loadfile2array("FITOPT001.FITRES.gz",
+    ...     datastrings=["SN:"], header="VARNAMES:", ignorecols=[0],
+    ...     converttofloat=True) # doctest: +SKIP
+    """
+    if isinstance(datastrings, (list, tuple)):
+        datastrings = datastrings[0] if len(datastrings) > 0 else ""
+    if isinstance(datadelims, (list, tuple)):
+        datadelims = datadelims[0] if len(datadelims) > 0 else ""
+    delim = _tobytes(datadelims or " ")
+    prefix = _tobytes(datastrings) + delim if datastrings else b''
+    if extension == '':
+        extension = os.path.splitext(fname)[1][1:]
+        if extension not in _COMPRESSORS:
+            extension = ''
+    names = arr.dtype.names or ()
+    if not isinstance(fmt, dict):
+        fmt = dict.fromkeys(names, fmt)
+
+    def formatblocks():
+        lines = [b'# ' + _tobytes(comment) + b'\n' for comment in comments]
+        if header is not None:
+            lines.append(delim.join([_tobytes(header)] +
+                                    [_tobytes(name) for name in names])
+                         + b'\n')
+        yield b''.join(lines)
+        for start in range(0, len(arr), blockrows):
+            block = arr[start: start + blockrows]
+            pieces = [prefix] if prefix else []
+            for i, name in enumerate(names):
+                if i > 0:
+                    pieces.append(delim)
+                pieces.append(_formatcolumn(block[name], fmt.get(name)))
+            pieces.append(b'\n')
+            yield _joinrows(pieces, len(block))
+
+    f = _createfile(fname, extension)
+    blocks = formatblocks()
+    if extension:
+        # compress a block while the next one is formatted
+        blocks = _prefetch(blocks)
+    try:
+        for data in blocks:
+            f.write(data)
+    finally:
+        f.close()
+
+
+def _skipspace(buf, starts, ends):
+    """
+    return the offsets of the first byte which is not whitespace in each
+    of the lines [starts, ends) of the uint8 array buf (ends for blank
+    lines)
+    """
+    pos = starts.copy()
+    idx = np.arange(len(pos))
+    last = max(len(buf) - 1, 0)
+    while len(idx) > 0:
+        p = pos[idx]
+        idx = idx[(p < ends[idx]) & _WHITESPACE[buf[np.minimum(p, last)]]]
+        pos[idx] += 1
+    return pos
+
+
+def _fixedwidthrows(buf, starts, ends, width, stride=None):
+    """
+    return the lines [starts, ends) of buf as a 2D uint8 array of the given
+    width. If the lines are stride bytes apart this is a view of buf,
+    otherwise they are copied and short lines are padded with spaces.
+    """
+    if stride is not None:
+        return np.lib.stride_tricks.as_strided(buf[starts[0]:],
+                                               shape=(len(starts), width),
+                                               strides=(stride, 1))
+    rows = np.empty((len(starts), width), dtype=np.uint8)
+    last = max(len(buf) - 1, 0)
+    for k in range(width):
+        rows[:, k] = np.where(starts + k < ends,
+                              buf[np.minimum(starts + k, last)], ord(' '))
+    return rows
+
+
+def loadfixedwidth2array(fname,
+    colspecs = None,
+    datastrings = [],
+    ignorestrings = ["#"],
+    ignorelines = [],
+    usecols = [],
+    keys = None,
+    makeintfloats = False,
+    blockrows = 65536):
+    """
+    load a table from the fixed width ASCII file fname into a numpy
+    structured array. The file is memory mapped and the columns are read
+    at fixed byte offsets from the start of each line, so the file is
+    never read line by line or tokenized. When the data lines are all of
+    the same length and contiguous (the usual case) each column is a
+    strided view of the mapped file and is converted directly from it.
+    Several processes reading the same file then share the pages of the
+    operating system's cache instead of each holding a copy.
+
+    Parameters
+    ----------
+    fname: mandatory, string
+        name of the file which is to be read
+    colspecs: optional, list of tuples (start, stop), defaults to None
+        byte offsets, relative to the start of the line, of the columns.
+        If None, they are detected as the runs of byte positions which
+        are not blank in all the data lines.
+    datastrings: optional, list of strings, defaults to []
+        if not empty, only lines starting with one of these are read
+    ignorestrings: optional, list of strings, defaults to ["#"]
+        lines starting with one of these are not read
+    ignorelines: optional, list of integers, defaults to []
+        line numbers (starting from 1) of lines which are not read
+    usecols: optional, list of integers, defaults to []
+        indices of the columns in colspecs to load, all if empty
+    keys: optional, list of strings, defaults to None
+        names of the fields, 'f0', 'f1', ... if None
+    makeintfloats: optional, bool, defaults to False
+        if True, columns of integers are converted to 'f8'
+    blockrows: optional, integer, defaults to 65536
+        number of lines examined at a time when detecting colspecs
+
+    Returns
+    -------
+    tuple: (numpy structured array, colspecs)
+        where colspecs are the byte offsets of all the columns, which can
+        be passed on to read similar files without detecting them again.
+        The types of the columns are guessed as in loadfile2array, and
+        strings are stripped of the surrounding whitespace.
+
+    Examples
+    --------
+    >>> data, colspecs = loadfixedwidth2array("catalog.dat",
+    ...     ignorestrings=["#"], keys=["id", "ra", "dec"]) # doctest: +SKIP
+    """
+    import mmap
+
+    with open(fname, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            buf = np.zeros(0, dtype=np.uint8)
+        else:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            buf = np.frombuffer(mm, dtype=np.uint8)
+
+    starts, ends, nlines = _linebounds(buf,
+                                       datastrings=[_tobytes(st) for st in
+                                                    datastrings],
+                                       ignorelines=ignorelines)
+    ignorestrings = [_tobytes(st) for st in ignorestrings]
+    keep = ~_startswith(buf, starts, ends, ignorestrings)
+    keep &= _skipspace(buf, starts, ends) < ends
+    starts, ends = starts[keep], ends[keep]
+    nrows = len(starts)
+    width = int((ends - starts).max()) if nrows > 0 else 0
+
+    # Are the lines evenly spaced, so that columns are strided views?
+    stride = None
+    if nrows > 0 and ((ends - starts) == width).all():
+        steps = np.diff(starts)
+        if nrows == 1:
+            stride = width
+        elif (steps == steps[0]).all():
+            stride = int(steps[0])
+
+    if colspecs is None:
+        blank = np.ones(width, dtype=bool)
+        for i in range(0, nrows, blockrows):
+            rows = _fixedwidthrows(buf, starts[i: i + blockrows],
+                                   ends[i: i + blockrows], width, stride)
+            blank &= _WHITESPACE[rows].all(axis=0)
+        nonblank = ~blank
+        colstarts = np.flatnonzero(nonblank &
+                                   np.concatenate(([True], blank[:-1])))
+        colstops = np.flatnonzero(nonblank &
+                                  np.concatenate((blank[1:], [True]))) + 1
+        colspecs = list(zip(colstarts.tolist(), colstops.tolist()))
+
+    specs = colspecs
+    if len(usecols) > 0:
+        specs = [colspecs[i] for i in sorted(set(usecols))]
+    columns = []
+    for start, stop in specs:
+        if stride is not None:
+            col = np.ndarray(shape=(nrows,), dtype='S%d' % (stop - start),
+                             buffer=buf, offset=int(starts[0]) + start,
+                             strides=(stride,))
+        else:
+            lengths = np.clip(ends - starts - start, 0, stop - start)
+            col = _gathertokens(buf, starts + start, lengths)
+        col = _convertcolumn(col, makeintfloats=makeintfloats)
+        if col.dtype.kind == 'S':
+            col = _castcolumn(np.char.strip(col), first=len(_TYPELADDER))[1]
+        columns.append(col)
+    if keys is None:
+        keys = ['f%d' % i for i in range(len(columns))]
+    dtype = [(str(key), col.dtype) for key, col in zip(keys, columns)]
+    return _columns2array(columns, dtype=dtype), colspecs
+
+
+
+class TableCache(object):
+    """
+    Cache of tables parsed by loadfile2array, kept as binary sidecars in
+    the directory cachedir. Each entry is a .npy file holding the
+    structured array (memory mapped when loaded) and a .npz file holding
+    the coldict. Entries are keyed by the path, size and modification
+    time of the file and by the arguments used to parse it, so a changed
+    file or different arguments never return stale data. The total size
+    of the cache is kept below maxbytes by removing the least recently
+    used entries.
+
+    Parameters
+    ----------
+    cachedir: mandatory, string
+        directory holding the sidecars, created if it does not exist
+    maxbytes: optional, integer, defaults to 2**30
+        maximum total size of the sidecars in bytes
+
+    Examples
+    --------
+    >>> cache = TableCache('/tmp/fitrescache') # doctest: +SKIP
+    >>> data, coldict, ret = loadfile2array("FITOPT001.FITRES",
+    ...     datastrings=["SN:"], converttofloat=True,
+    ...     cache=cache) # doctest: +SKIP
+    >>> cache.invalidate("FITOPT001.FITRES") # doctest: +SKIP
+    """
+    def __init__(self, cachedir, maxbytes=2**30):
+        self.cachedir = cachedir
+        self.maxbytes = maxbytes
+        if not os.path.isdir(cachedir):
+            os.makedirs(cachedir)
+
+    @staticmethod
+    def _pathhash(fname):
+        return hashlib.sha1(_tobytes(os.path.abspath(fname))).hexdigest()
+
+    def key(self, fname, **parseargs):
+        """
+        return the key of the entry for the file fname parsed with the
+        keyword arguments parseargs
+        """
+        st = os.stat(fname)
+        args = repr((st.st_size, st.st_mtime, sorted(parseargs.items())))
+        return '%s-%s' % (self._pathhash(fname),
+                          hashlib.sha1(_tobytes(args)).hexdigest())
+
+    def _paths(self, key):
+        stem = os.path.join(self.cachedir, key)
+        return stem + '.npy', stem + '.npz'
+
+    def load(self, key):
+        """
+        return the tuple (array, coldict) stored under key, with the array
+        memory mapped (copy on write), or None if there is no such entry
+        """
+        arrpath, dictpath = self._paths(key)
+        try:
+            arr = np.load(arrpath, mmap_mode='c')
+            with np.load(dictpath) as stored:
+                coldict = dict(zip(stored['keys'].tolist(),
+                                   stored['rows'].tolist()))
+        except (IOError, OSError):
+            return None
+        # Mark the entry as recently used
+        os.utime(arrpath, None)
+        return arr, coldict
+
+    def save(self, key, arr, coldict):
+        """
+        store the structured array arr and coldict under key, and evict
+        the least recently used entries if the cache is too large
+        """
+        arrpath, dictpath = self._paths(key)
+        f, arrtmp = _tempfile(arrpath)
+        with f:
+            np.save(f, arr)
+        f, dicttmp = _tempfile(dictpath)
+        with f:
+            np.savez(f, keys=np.array(list(coldict.keys())),
+                     rows=np.array(list(coldict.values()), dtype=np.int64))
+        _replacefile(dicttmp, dictpath)
+        _replacefile(arrtmp, arrpath)
+        self.evict()
+
+    def _entries(self):
+        """
+        list of (last use, size, key) for the entries in the cache
+        """
+        entries = []
+        for name in os.listdir(self.cachedir):
+            if not name.endswith('.npy'):
+                continue
+            key = name[:-4]
+            try:
+                size = 0
+                for path in self._paths(key):
+                    size += os.path.getsize(path)
+                lastused = os.path.getmtime(self._paths(key)[0])
+            except OSError:
+                continue
+            entries.append((lastused, size, key))
+        return entries
+
+    def _remove(self, key):
+        for path in self._paths(key):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def evict(self):
+        """
+        remove the least recently used entries until the sidecars take
+        at most maxbytes
+        """
+        entries = sorted(self._entries())
+        total = sum(size for lastused, size, key in entries)
+        for lastused, size, key in entries:
+            if total <= self.maxbytes:
+                break
+            self._remove(key)
+            total -= size
+
+    def invalidate(self, fname=None):
+        """
+        remove all the entries for the file fname, or all the entries in
+        the cache if fname is None
+        """
+        prefix = ''
+        if fname is not None:
+            prefix = self._pathhash(fname) + '-'
+        for lastused, size, key in self._entries():
+            if key.startswith(prefix):
+                self._remove(key)
+
+
+class ColumnIndex(object):
+    """
+    Index from the values of one or more key columns of a table (eg. the
+    CIDs of a FITRES table) to the row numbers, for many lookups at once.
+    The keys are kept sorted in a numpy array with the permutation to the
+    rows, so a lookup of an array of keys is a single searchsorted call.
+    Composite keys are encoded as integers from the ranks of the values of
+    each column. Unlike the coldict of loadfile2array, the index can be
+    built from any columns and saved next to the data.
+
+    Parameters
+    ----------
+    columns: mandatory, one or more array-like objects of the same length
+        key columns of the table
+
+    Examples
+    --------
+    >>> index = ColumnIndex(np.array(['SN3', 'SN1', 'SN2']))
+    >>> index.lookup(['SN2', 'SN9', 'SN3'])
+    array([ 2, -1,  0])
+    >>> index = ColumnIndex(np.array([1, 1, 2]), np.array([10, 20, 10]))
+    >>> index.lookup([2, 1], [10, 20])
+    array([2, 1])
+    """
+    def __init__(self, *columns):
+        if len(columns) == 0:
+            raise ValueError('ColumnIndex needs at least one key column')
+        columns = [np.asarray(col) for col in columns]
+        self.uniques = None
+        if len(columns) == 1:
+            keys = columns[0]
+        else:
+            self.uniques = [np.unique(col) for col in columns]
+            if np.prod([max(len(u), 1) for u in self.uniques],
+                       dtype=float) >= 2.**63:
+                raise ValueError('too many distinct composite keys')
+            keys = self._encode(columns)
+        self.order = np.argsort(keys, kind='mergesort')
+        self.sortedkeys = keys[self.order]
+        self.digest = None
+
+    @staticmethod
+    def _digest(columns):
+        """
+        return the SHA-1 hex digest of the types and contents of the key
+        columns
+        """
+        digest = hashlib.sha1()
+        for col in columns:
+            col = np.ascontiguousarray(col)
+            digest.update(_tobytes(col.dtype.str))
+            digest.update(col.view(np.uint8).reshape(-1))
+        return digest.hexdigest()
+
+    @property
+    def numkeys(self):
+        """number of key columns"""
+        return 1 if self.uniques is None else len(self.uniques)
+
+    def __len__(self):
+        return len(self.sortedkeys)
+
+    def _encode(self, columns):
+        """
+        encode the composite keys in columns as integers, -1 for values not
+        in the index
+        """
+        code = np.zeros(len(columns[0]), dtype=np.int64)
+        missing = np.zeros(len(code), dtype=bool)
+        for uniq, col in zip(self.uniques, columns):
+            if len(uniq) == 0:
+                missing[:] = True
+                continue
+            i = np.minimum(np.searchsorted(uniq, col), len(uniq) - 1)
+            missing |= uniq[i] != col
+            code = code * len(uniq) + i
+        code[missing] = -1
+        return code
+
+    def lookup(self, *keys):
+        """
+        return the array of the row numbers of the keys (one array-like
+        object per key column), -1 for keys which are not in the index.
+        If a key occurs in several rows, the first one is returned.
+        """
+        if len(keys) != self.numkeys:
+            raise ValueError('expected %d key columns, got %d'
+                             % (self.numkeys, len(keys)))
+        keys = [np.atleast_1d(np.asarray(key)) for key in keys]
+        query = keys[0] if self.uniques is None else self._encode(keys)
+        if len(self.sortedkeys) == 0:
+            return np.repeat(-1, len(query))
+        i = np.minimum(np.searchsorted(self.sortedkeys, query),
+                       len(self.sortedkeys) - 1)
+        return np.where(self.sortedkeys[i] == query, self.order[i], -1)
+
+    def save(self, fname):
+        """
+        save the index to the .npz file fname
+        """
+        arrays = dict(sortedkeys=self.sortedkeys, order=self.order)
+        if self.digest is not None:
+            arrays['digest'] = np.array([_tobytes(self.digest)])
+        for i, uniq in enumerate(self.uniques or []):
+            arrays['uniques%d' % i] = uniq
+        with open(fname, 'wb') as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, fname):
+        """
+        return the index saved in the .npz file fname
+        """
+        index = cls.__new__(cls)
+        with np.load(fname) as stored:
+            index.sortedkeys = stored['sortedkeys']
+            index.order = stored['order']
+            numuniques = len([k for k in stored.files
+                              if k.startswith('uniques')])
+            index.uniques = None
+            if numuniques > 0:
+                index.uniques = [stored['uniques%d' % i]
+                                 for i in range(numuniques)]
+            index.digest = None
+            if 'digest' in stored.files:
+                index.digest = _nativestrings(stored['digest'])[0]
+        return index
+
+    @classmethod
+    def forfile(cls, fname, arr, names):
+        """
+        return the index of the fields names of the array arr loaded from
+        the file fname. The index is saved next to the file, and loaded
+        from there instead of being built again as long as it is newer
+        than the file and was built from the same rows, ie. key columns
+        of the same length and digest (arr may have been loaded with
+        other usecols, where or datastrings).
+        """
+        if isinstance(names, str):
+            names = [names]
+        indexname = '%s.%s.idx.npz' % (fname, '-'.join(names))
+        columns = [arr[name] for name in names]
+        digest = cls._digest(columns)
+        if (os.path.exists(indexname) and
+                os.path.getmtime(indexname) >= os.path.getmtime(fname)):
+            index = cls.load(indexname)
+            if len(index) == len(arr) and index.digest == digest:
+                return index
+        index = cls(*columns)
+        index.digest = digest
+        index.save(indexname)
+        return index
+
+
+_MANIFEST = 'manifest.json'
+
+
+def savecolumns(dirname, arr, compression=None):
+    """
+    save the numpy structured array arr (eg. from loadfile2array) to the
+    directory dirname in a columnar layout: one .npy file per field and a
+    JSON manifest listing them, which is written last. Columns stored
+    without compression can then be memory mapped one by one by
+    loadcolumns, without parsing or reading the other columns.
+
+    Parameters
+    ----------
+    dirname: mandatory, string
+        directory of the columns, created if it does not exist
+    arr: mandatory, numpy structured array
+        table to save
+    compression: optional, string or dictionary, defaults to None
+        'gz', 'bz2' or 'xz' to compress all the columns in this format,
+        or a dictionary of the formats of some of the columns by name.
+        Compressed columns cannot be memory mapped.
+
+    Raises
+    ------
+    ValueError
+        if a compression format is not known
+
+    Examples
+    --------
+    >>> data = loadfile2array("FITOPT001.FITRES", datastrings=["SN:"],
+    ...     header="VARNAMES:", converttofloat=True)[0] # doctest: +SKIP
+    >>> savecolumns("FITOPT001.cols", data,
+    ...             compression={"CID": "gz"}) # doctest: +SKIP
+    >>> z = loadcolumns("FITOPT001.cols", ["z"])["z"] # doctest: +SKIP
+    """
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+    manifest = {'version': 1, 'numrows': len(arr), 'columns': []}
+    for i, name in enumerate(arr.dtype.names):
+        if isinstance(compression, dict):
+            extension = compression.get(name) or ''
+        else:
+            extension = compression or ''
+        fname = '%d_%s.npy' % (i, re.sub(r'[^\w.-]', '_', name))
+        if extension:
+            fname += '.' + extension
+        column = np.ascontiguousarray(arr[name])
+        f = _createfile(os.path.join(dirname, fname), extension)
+        try:
+            np.lib.format.write_array(f, column, allow_pickle=False)
+        finally:
+            f.close()
+        manifest['columns'].append({'name': name,
+                                    'dtype': column.dtype.str,
+                                    'file': fname,
+                                    'compression': extension or None})
+    f, tmp = _tempfile(os.path.join(dirname, _MANIFEST), 'w')
+    with f:
+        json.dump(manifest, f, indent=1)
+    _replacefile(tmp, os.path.join(dirname, _MANIFEST))
+
+
+def loadcolumns(dirname, columns=None, mmap_mode='r', asarray=False):
+    """
+    load columns saved by savecolumns in the directory dirname.
+
+    Parameters
+    ----------
+    dirname: mandatory, string
+        directory of the columns
+    columns: optional, list of strings, defaults to None
+        names of the columns to load, or None for all of them. The files
+        of the other columns are not opened.
+    mmap_mode: optional, defaults to 'r'
+        mode in which the uncompressed columns are memory mapped (as for
+        numpy.load), or None to read them into memory
+    asarray: optional, bool, defaults to False
+        if True, return a numpy structured array (a copy) rather than
+        the columns
+
+    Returns
+    -------
+    ordered dictionary of the arrays of the columns by name, in the order
+    of columns (or of the saved table), or a numpy structured array
+
+    Raises
+    ------
+    KeyError
+        if a column is not in the manifest
+    """
+    with open(os.path.join(dirname, _MANIFEST)) as f:
+        manifest = json.load(f)
+    entries = collections.OrderedDict((str(entry['name']), entry)
+                                      for entry in manifest['columns'])
+    if columns is None:
+        columns = list(entries.keys())
+    loaded = collections.OrderedDict()
+    for name in columns:
+        if name not in entries:
+            raise KeyError("no column %s in %s" % (name, dirname))
+        entry = entries[name]
+        path = os.path.join(dirname, entry['file'])
+        if entry['compression'] is None:
+            loaded[name] = np.load(path, mmap_mode=mmap_mode,
+                                   allow_pickle=False)
+            continue
+        f = _openfile(path, str(entry['compression']))
+        try:
+            loaded[name] = np.lib.format.read_array(f, allow_pickle=False)
+        finally:
+            f.close()
+    if not asarray:
+        return loaded
+    arr = np.zeros(manifest['numrows'],
+                   dtype=[(name, column.dtype, column.shape[1:])
+                          for name, column in loaded.items()])
+    for name, column in loaded.items():
+        arr[name] = column
+    return arr
+
+
+class AsyncLoader(object):
+    """
+    asyncio interface to the loaders of this module, for programs running
+    an event loop (python 3.5 or later). Its methods take the arguments
+    of the loaders and return awaitables, the files being read,
+    decompressed and parsed in a pool of concurrency threads, so that the
+    event loop is never blocked. At most concurrency loads run at once,
+    whatever the executor; the others wait for a free slot without
+    blocking. iterfile2array returns an asynchronous iterator over the
+    chunks.
+
+    Parameters
+    ----------
+    concurrency: optional, integer, defaults to 4
+        number of threads, and of loads running at the same time
+    executor: optional, concurrent.futures.Executor, defaults to None
+        if not None, executor of the loads of whole files, eg. a
+        ProcessPoolExecutor for CPU bound parsing. The chunks of
+        iterfile2array are always produced in the threads.
+
+    Examples
+    --------
+    >>> async def ingest(fnames): # doctest: +SKIP
+    ...     with AsyncLoader(concurrency=8) as loader:
+    ...         tables = await asyncio.gather(*[loader.loadfile2array(
+    ...             fname, datastrings=["SN:"], converttofloat=True)
+    ...             for fname in fnames])
+    ...         async for chunk in loader.iterfile2array("big.FITRES",
+    ...                 datastrings=["SN:"]):
+    ...             process(chunk)
+    """
+    def __init__(self, concurrency=4, executor=None):
+        from concurrent import futures
+
+        self.concurrency = concurrency
+        self.threads = futures.ThreadPoolExecutor(max_workers=concurrency)
+        self.executor = executor if executor is not None else self.threads
+        self._loop = None
+        self._semaphore = None
+
+    def _run(self, executor, func, *args, **kwargs):
+        """
+        return an asyncio future of func(*args, **kwargs) run in executor
+        once one of the concurrency slots of the loader is free
+        """
+        import asyncio
+        import functools
+
+        loop = asyncio.get_event_loop()
+        if self._loop is not loop:
+            # a semaphore belongs to the event loop it is first used in
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        semaphore = self._semaphore
+        result = loop.create_future()
+
+        def done(future):
+            semaphore.release()
+            if result.cancelled():
+                return
+            if future.cancelled():
+                result.cancel()
+            elif future.exception() is not None:
+                result.set_exception(future.exception())
+            else:
+                result.set_result(future.result())
+
+        def start(acquired):
+            if result.cancelled():
+                semaphore.release()
+                return
+            loop.run_in_executor(
+                executor, functools.partial(func, *args, **kwargs)
+            ).add_done_callback(done)
+
+        loop.create_task(semaphore.acquire()).add_done_callback(start)
+        return result
+
+    def loadfile2array(self, fname, **kwargs):
+        """
+        awaitable of loadfile2array(fname, **kwargs)
+        """
+        return self._run(self.executor, loadfile2array, fname, **kwargs)
+
+    def loadfiles2array(self, fnames, **kwargs):
+        """
+        awaitable of loadfiles2array(fnames, **kwargs)
+        """
+        return self._run(self.executor, loadfiles2array, fnames, **kwargs)
+
+    def loadcolumns(self, dirname, **kwargs):
+        """
+        awaitable of loadcolumns(dirname, **kwargs)
+        """
+        return self._run(self.executor, loadcolumns, dirname, **kwargs)
+
+    def builddict(self, fname, **kwargs):
+        """
+        awaitable of builddict(fname, **kwargs)
+        """
+        return self._run(self.threads, builddict, fname, **kwargs)
+
+    def iterfile2array(self, fname, **kwargs):
+        """
+        asynchronous iterator over the chunks of iterfile2array(fname,
+        **kwargs), each of which is read and parsed in a thread when it is
+        awaited
+        """
+        return _AsyncChunks(self, iterfile2array(fname, **kwargs))
+
+    def close(self):
+        """
+        shut down the threads (and the executor) once the loads running
+        are done
+        """
+        self.threads.shutdown(wait=False)
+        if self.executor is not self.threads:
+            self.executor.shutdown(wait=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _AsyncChunks(object):
+    """
+    asynchronous iterator over the items of the generator chunks, each of
+    which is produced in the threads of the AsyncLoader loader
+    """
+    def __init__(self, loader, chunks):
+        import threading
+
+        self.loader = loader
+        self.chunks = chunks
+        self.lock = threading.Lock()
+
+    def _next(self):
+        with self.lock:
+            try:
+                return next(self.chunks)
+            except StopIteration:
+                raise StopAsyncIteration
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        return self.loader._run(self.loader.threads, self._next)
+
 
 if __name__ == "__main__":
 
     myline = "KJAHS KH AKJHS jjhJH. JH HJ   JHH JH #tests "
 
-    (lst , comment ) = tokenizeline(myline, delimstrings = ".")
-    print lst 
-    print comment
+    (lst , comment ) = tokenizeline(myline, delimitter = ".")
+    print(lst)
+    print(comment)
 
-    print "######################################################\n"
-    print "######################################################\n"
-    print "######################################################\n"
-    print "######################################################\n"
+    print("######################################################\n")
+    print("######################################################\n")
+    print("######################################################\n")
+    print("######################################################\n")
 
     
-    print "Test build dict"
+    print("Test build dict")
     haccdict = builddict (fname  = "example_data/indat.params",
         dictdelim = " ")
         
-    print haccdict
+    print(haccdict)